@@ -0,0 +1,28 @@
+from typing import List, Optional
+
+
+def option_value(command: List[str], flag: str) -> Optional[str]:
+    """Returns the value of a flag given as "flag value" or "flag=value", or None if absent."""
+    for i, part in enumerate(command):
+        if part == flag and i + 1 < len(command):
+            return command[i + 1]
+        if part.startswith(flag + "="):
+            return part.split("=", 1)[1]
+    return None
+
+
+def replace_option(command: List[str], flag: str, value: str) -> List[str]:
+    """Returns a copy of the command with the flag set to value (added if missing)."""
+    updated = []
+    skip = False
+    for i, part in enumerate(command):
+        if skip:
+            skip = False
+            continue
+        if part == flag and i + 1 < len(command):
+            skip = True
+            continue
+        if part.startswith(flag + "="):
+            continue
+        updated.append(part)
+    return updated + [flag, value]
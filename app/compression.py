@@ -0,0 +1,94 @@
+import os
+import gzip
+import time
+import shutil
+import logging
+import tempfile
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+MIN_COMPRESS_BYTES = 4 * 1024
+COMPRESSIBLE_EXTENSIONS = {".xml", ".txt", ".json", ".jsonl", ".stdout", ".stderr", ".html", ".csv", ".rc"}
+
+
+def get_compression_codec() -> Optional[str]:
+    """
+    Reads GCS_COMPRESSION: 'gzip', 'zstd', 'auto' (zstd when installed, else gzip) or 'none' (default).
+    """
+    codec = os.getenv("GCS_COMPRESSION", "none").lower()
+    if codec == "auto":
+        return "zstd" if zstandard else "gzip"
+    if codec == "zstd" and not zstandard:
+        logger.warning("GCS_COMPRESSION=zstd but the zstandard package is not installed, using gzip.")
+        return "gzip"
+    return codec if codec in ("gzip", "zstd") else None
+
+
+def should_compress(local_file_path: str) -> bool:
+    extension = os.path.splitext(local_file_path)[1].lower()
+    return extension in COMPRESSIBLE_EXTENSIONS and os.path.getsize(local_file_path) >= MIN_COMPRESS_BYTES
+
+
+class CompressedArtifact:
+    """
+    A temporary compressed copy of a local file, produced by streaming it from disk.
+    Use as a context manager so the temporary file is always removed.
+    """
+
+    def __init__(self, local_file_path: str, codec: str):
+        self.source_path = local_file_path
+        self.codec = codec
+        self.original_bytes = os.path.getsize(local_file_path)
+        self.path = None
+        self.compressed_bytes = 0
+        self.compress_seconds = 0.0
+
+    def __enter__(self) -> "CompressedArtifact":
+        started = time.monotonic()
+        fd, self.path = tempfile.mkstemp(suffix=".gz" if self.codec == "gzip" else ".zst")
+        with open(self.source_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if self.codec == "zstd":
+                zstandard.ZstdCompressor(level=6).copy_stream(src, dst, read_size=COPY_CHUNK_SIZE)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, COPY_CHUNK_SIZE)
+        self.compress_seconds = time.monotonic() - started
+        self.compressed_bytes = os.path.getsize(self.path)
+        return self
+
+    def __exit__(self, *exc):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def ratio(self) -> float:
+        return self.original_bytes / self.compressed_bytes if self.compressed_bytes else 1.0
+
+    @property
+    def worthwhile(self) -> bool:
+        return self.compressed_bytes < self.original_bytes
+
+    def seconds_saved(self, upload_seconds: float) -> float:
+        """Estimates upload time saved, from the throughput observed for the compressed upload."""
+        if not upload_seconds or not self.compressed_bytes:
+            return 0.0
+        throughput = self.compressed_bytes / upload_seconds
+        return (self.original_bytes / throughput) - upload_seconds - self.compress_seconds
+
+
+def decompress_bytes(data: bytes, content_encoding: Optional[str]) -> bytes:
+    """Decodes a downloaded artifact according to its Content-Encoding."""
+    if content_encoding == "gzip" and data[:2] == b"\x1f\x8b":
+        return gzip.decompress(data)
+    if content_encoding == "zstd":
+        if not zstandard:
+            raise RuntimeError("Artifact is zstd-compressed but the zstandard package is not installed.")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
@@ -0,0 +1,185 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DURATIONS_DB = "/app/outputs/durations.sqlite3"
+DEFAULT_TOOL_TIMEOUT = 3600
+MIN_TOOL_TIMEOUT = 60
+# Without history a tool is assumed to need this long when splitting a deadline.
+DEFAULT_ESTIMATE = 600
+HISTORY_SIZE = 20
+TIMEOUT_SLACK = 3.0
+# Parameters that change how much work a run does: its wordlist and the ports it covers.
+SHAPE_FLAGS = ("-w", "-p", "--ports", "--top-ports", "-F", "-p-")
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+def get_default_timeout() -> float:
+    """Timeout of a tool without history (RECON_TOOL_TIMEOUT), and the cap of adaptive timeouts."""
+    return _env_number("RECON_TOOL_TIMEOUT", DEFAULT_TOOL_TIMEOUT)
+
+
+def _param(param: Any):
+    if isinstance(param, dict):
+        return param.get("flag"), param.get("value")
+    return getattr(param, "flag", None), getattr(param, "value", None)
+
+
+def command_shape(tool_name: str, parameters: List) -> str:
+    """
+    The history key of a run: the tool, its mode (gobuster dir/dns/vhost) and its wordlist and
+    port-range parameters, so e.g. a full-port nmap run is not estimated from --top-ports runs.
+    """
+    params = [_param(p) for p in parameters]
+    shape = [tool_name.lower()]
+    shape += [str(value) for flag, value in params if flag == "mode" and value]
+    shape += [flag if value in (None, "", True) else f"{flag}={value}" for flag, value in params if flag in SHAPE_FLAGS]
+    return " ".join(shape)
+
+
+def get_scan_deadline(requested: Optional[float] = None) -> Optional[float]:
+    """Wall-clock seconds a whole scan may take: the request's deadline, else RECON_SCAN_DEADLINE."""
+    deadline = requested or _env_number("RECON_SCAN_DEADLINE", 0)
+    return deadline if deadline and deadline > 0 else None
+
+
+class DurationHistory:
+    """
+    Keeps the last HISTORY_SIZE durations of complete runs of every command shape (see command_shape),
+    per target, in a local SQLite file. Estimates are the slowest recent run scaled to the number of
+    targets, so a tool that sometimes needs longer is not cut short by its typical duration.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS run_durations (id INTEGER PRIMARY KEY, shape TEXT NOT NULL, "
+                "seconds_per_target REAL NOT NULL, finished REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_run_durations_shape ON run_durations (shape, id)")
+            self._initialized = True
+        return conn
+
+    def record(self, shape: str, seconds: float, targets: int = 1):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO run_durations (shape, seconds_per_target, finished) VALUES (?, ?, ?)",
+                         (shape, seconds / max(1, targets), time.time()))
+            conn.execute(
+                "DELETE FROM run_durations WHERE shape = ? AND id NOT IN "
+                "(SELECT id FROM run_durations WHERE shape = ? ORDER BY id DESC LIMIT ?)", (shape, shape, HISTORY_SIZE)
+            )
+
+    def estimate(self, shape: str, targets: int = 1) -> Optional[float]:
+        """Expected duration of a run over `targets` targets, or None without history."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT MAX(seconds_per_target) FROM run_durations WHERE shape = ?",
+                               (shape,)).fetchone()
+        return row[0] * max(1, targets) if row and row[0] is not None else None
+
+
+_history: Optional[DurationHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_duration_history() -> DurationHistory:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = DurationHistory(os.getenv("RECON_DURATIONS_DB", DEFAULT_DURATIONS_DB))
+        return _history
+
+
+def _estimate(shape: str, targets: int) -> Optional[float]:
+    try:
+        return get_duration_history().estimate(shape, targets)
+    except Exception:
+        logger.exception("Reading tool duration history failed")
+        return None
+
+
+def _timeout_for_estimate(estimate: Optional[float]) -> float:
+    if estimate is None:
+        return get_default_timeout()
+    return min(get_default_timeout(), max(MIN_TOOL_TIMEOUT, estimate * TIMEOUT_SLACK))
+
+
+def adaptive_timeout(shape: str, targets: int = 1) -> float:
+    """
+    A timeout from the history of a command shape: TIMEOUT_SLACK times its estimate, within
+    [60s, RECON_TOOL_TIMEOUT]. Only used to split a scan deadline; otherwise tools get RECON_TOOL_TIMEOUT.
+    """
+    return _timeout_for_estimate(_estimate(shape, targets))
+
+
+def record_duration(shape: str, seconds: float, targets: int = 1):
+    """Adds a complete run to the history. Failures are logged, never raised."""
+    try:
+        get_duration_history().record(shape, seconds, targets)
+    except Exception:
+        logger.exception("Recording tool duration failed")
+
+
+class ScanDeadline:
+    """
+    Splits a scan-wide time budget across its tools as they start.
+    - Each tool gets at most its adaptive timeout and never more than the time left.
+    - When the tools still to start are expected to need more than the time left (at the scan's
+      parallelism), each gets a share proportional to its estimate.
+    - Without a budget, every tool gets RECON_TOOL_TIMEOUT and the history is not consulted.
+    """
+
+    def __init__(self, budget: Optional[float], shapes: List[str], target_counts: List[int], parallelism: int):
+        self.budget = budget
+        self.ends_at = time.monotonic() + budget if budget else None
+        self.parallelism = max(1, parallelism)
+        self._timeouts: Dict[int, float] = {}
+        self._estimates: Dict[int, float] = {}
+        if budget:
+            for index, (shape, count) in enumerate(zip(shapes, target_counts)):
+                estimate = _estimate(shape, count)
+                self._timeouts[index] = _timeout_for_estimate(estimate)
+                self._estimates[index] = estimate or min(DEFAULT_ESTIMATE, self._timeouts[index])
+        self._not_started = set(range(len(shapes)))
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        return self.ends_at - time.monotonic() if self.ends_at is not None else None
+
+    def timeout_for(self, index: int) -> float:
+        """The timeout of job `index`, which is starting now. 0 means the deadline has passed."""
+        remaining = self.remaining()
+        if remaining is None:
+            return get_default_timeout()
+        with self._lock:
+            pending = [i for i in self._not_started if i != index] + [index]
+            self._not_started.discard(index)
+        if remaining <= 0:
+            return 0
+        timeout = self._timeouts[index]
+        capacity = remaining * min(self.parallelism, len(pending))
+        demand = sum(self._estimates[i] for i in pending)
+        if demand > capacity:
+            timeout = min(timeout, max(MIN_TOOL_TIMEOUT, capacity * self._estimates[index] / demand))
+        return min(timeout, remaining)
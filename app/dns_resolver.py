@@ -0,0 +1,266 @@
+import os
+import socket
+import random
+import struct
+import asyncio
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_AAAA = 28
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+DEFAULT_CONCURRENCY = 200
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_RETRIES = 2
+
+Nameserver = Tuple[str, int]
+
+
+class ResolvedHost(NamedTuple):
+    name: str
+    a: List[str]
+    aaaa: List[str]
+    cname: List[str]
+    ttl: Optional[int]
+    error: Optional[str] = None
+
+
+class DnsAnswer(NamedTuple):
+    rcode: int
+    truncated: bool
+    records: List[Tuple[int, str, int]]  # (type, value, ttl)
+
+
+class DnsError(Exception):
+    pass
+
+
+def parse_nameserver(value: str) -> Nameserver:
+    """Parses 'host', 'host:port' or '[v6]:port' into a (host, port) pair."""
+    value = value.strip()
+    if value.startswith("["):
+        host, _, port = value[1:].partition("]:")
+        return host.rstrip("]"), int(port or 53)
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, 53
+
+
+def get_default_nameservers() -> List[Nameserver]:
+    """Reads RECON_DNS_NAMESERVERS (comma separated), falling back to /etc/resolv.conf."""
+    configured = os.getenv("RECON_DNS_NAMESERVERS")
+    if configured:
+        return [parse_nameserver(ns) for ns in configured.split(",") if ns.strip()]
+    nameservers = []
+    try:
+        with open("/etc/resolv.conf", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    nameservers.append((parts[1], 53))
+    except OSError:
+        pass
+    return nameservers or [("8.8.8.8", 53), ("1.1.1.1", 53)]
+
+
+def build_query(query_id: int, name: str, record_type: int) -> bytes:
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)  # recursion desired
+    qname = b"".join(
+        bytes([len(label)]) + label for label in (l.encode("idna") for l in name.rstrip(".").split(".")) if label
+    ) + b"\x00"
+    return header + qname + struct.pack("!HH", record_type, CLASS_IN)
+
+
+def _read_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """Decodes a possibly compressed name; returns it with the offset right after it."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            jumps += 1
+            if jumps > 64:
+                raise DnsError("Compression loop in DNS response")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(message[offset:offset + length].decode("ascii", errors="replace"))
+        offset += length
+    return ".".join(labels).lower(), end if end is not None else offset
+
+
+def parse_response(message: bytes) -> Tuple[int, DnsAnswer]:
+    """Parses a DNS response into its id and the A/AAAA/CNAME records of the answer section."""
+    if len(message) < 12:
+        raise DnsError("Short DNS response")
+    query_id, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", message[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(message, offset)
+        offset += 4
+    records = []
+    for _ in range(ancount):
+        _, offset = _read_name(message, offset)
+        record_type, _, ttl, rdlength = struct.unpack("!HHIH", message[offset:offset + 10])
+        offset += 10
+        rdata_offset = offset
+        offset += rdlength
+        if record_type == TYPE_A and rdlength == 4:
+            records.append((record_type, socket.inet_ntop(socket.AF_INET, message[rdata_offset:offset]), ttl))
+        elif record_type == TYPE_AAAA and rdlength == 16:
+            records.append((record_type, socket.inet_ntop(socket.AF_INET6, message[rdata_offset:offset]), ttl))
+        elif record_type == TYPE_CNAME:
+            records.append((record_type, _read_name(message, rdata_offset)[0], ttl))
+    return query_id, DnsAnswer(flags & 0x000F, bool(flags & 0x0200), records)
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    """One shared UDP socket per nameserver; responses are matched to queries by id."""
+
+    def __init__(self):
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            query_id, answer = parse_response(data)
+        except (DnsError, IndexError, struct.error):
+            return
+        future = self.pending.pop(query_id, None)
+        if future and not future.done():
+            future.set_result(answer)
+
+    def error_received(self, exc):
+        logger.debug(f"DNS socket error: {exc}")
+
+
+class AsyncResolver:
+    """
+    Bulk asyncio DNS resolver for A, AAAA and CNAME records.
+    - At most `concurrency` queries are in flight at once.
+    - Each query is retried up to `retries` times on timeout or SERVFAIL, rotating nameservers.
+    - Truncated UDP answers are retried over TCP.
+    """
+
+    def __init__(self, nameservers: Optional[List[Nameserver]] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES):
+        self.nameservers = nameservers or get_default_nameservers()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        # The endpoint of each nameserver is created once; concurrent queries await the same task.
+        self._endpoints: Dict[Nameserver, asyncio.Task] = {}
+        self._semaphore = None
+
+    async def _protocol_for(self, nameserver: Nameserver) -> _UdpProtocol:
+        endpoint = self._endpoints.get(nameserver)
+        if endpoint is None:
+            loop = asyncio.get_running_loop()
+            endpoint = loop.create_task(loop.create_datagram_endpoint(_UdpProtocol, remote_addr=nameserver))
+            self._endpoints[nameserver] = endpoint
+        try:
+            _, protocol = await asyncio.shield(endpoint)
+        except OSError:
+            # Let a later query try again instead of failing on the same error forever.
+            if self._endpoints.get(nameserver) is endpoint:
+                del self._endpoints[nameserver]
+            raise
+        return protocol
+
+    async def _query_udp(self, nameserver: Nameserver, name: str, record_type: int) -> DnsAnswer:
+        protocol = await self._protocol_for(nameserver)
+        query_id = random.randrange(65536)
+        while query_id in protocol.pending:
+            query_id = random.randrange(65536)
+        future = asyncio.get_running_loop().create_future()
+        protocol.pending[query_id] = future
+        try:
+            protocol.transport.sendto(build_query(query_id, name, record_type))
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            protocol.pending.pop(query_id, None)
+
+    async def _query_tcp(self, nameserver: Nameserver, name: str, record_type: int) -> DnsAnswer:
+        query = build_query(random.randrange(65536), name, record_type)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*nameserver), self.timeout)
+        try:
+            writer.write(struct.pack("!H", len(query)) + query)
+            await writer.drain()
+            length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+            return parse_response(await asyncio.wait_for(reader.readexactly(length), self.timeout))[1]
+        finally:
+            writer.close()
+
+    async def query(self, name: str, record_type: int) -> DnsAnswer:
+        last_error = "no nameservers"
+        for attempt in range(self.retries + 1):
+            nameserver = self.nameservers[attempt % len(self.nameservers)]
+            try:
+                async with self._semaphore:
+                    answer = await self._query_udp(nameserver, name, record_type)
+                    if answer.truncated:
+                        answer = await self._query_tcp(nameserver, name, record_type)
+            except (asyncio.TimeoutError, OSError, DnsError, asyncio.IncompleteReadError) as e:
+                last_error = f"{type(e).__name__} from {nameserver[0]}"
+                continue
+            if answer.rcode in (RCODE_NOERROR, RCODE_NXDOMAIN):
+                return answer
+            last_error = f"rcode {answer.rcode} from {nameserver[0]}"
+        raise DnsError(last_error)
+
+    async def resolve_one(self, name: str) -> ResolvedHost:
+        answers = await asyncio.gather(
+            self.query(name, TYPE_A), self.query(name, TYPE_AAAA), return_exceptions=True
+        )
+        a, aaaa, cname, ttls, errors = [], [], [], [], []
+        for answer in answers:
+            if isinstance(answer, Exception):
+                errors.append(str(answer))
+                continue
+            if answer.rcode == RCODE_NXDOMAIN:
+                errors.append("NXDOMAIN")
+            for record_type, value, ttl in answer.records:
+                target = {TYPE_A: a, TYPE_AAAA: aaaa, TYPE_CNAME: cname}[record_type]
+                if value not in target:
+                    target.append(value)
+                ttls.append(ttl)
+        error = None if (a or aaaa or cname) else (errors[0] if errors else "NODATA")
+        return ResolvedHost(name, a, aaaa, cname, min(ttls) if ttls else None, error)
+
+    async def resolve_many(self, names: Iterable[str]) -> Dict[str, ResolvedHost]:
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            unique = list(dict.fromkeys(n.strip().lower().rstrip(".") for n in names if n.strip()))
+            results = await asyncio.gather(*(self.resolve_one(name) for name in unique))
+            return {result.name: result for result in results}
+        finally:
+            for endpoint in self._endpoints.values():
+                if endpoint.done() and not endpoint.cancelled() and endpoint.exception() is None:
+                    endpoint.result()[0].close()
+                else:
+                    endpoint.cancel()
+            self._endpoints.clear()
+
+
+def resolve_hosts(names: Iterable[str], nameservers: Optional[List[Nameserver]] = None,
+                  concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                  retries: int = DEFAULT_RETRIES) -> Dict[str, ResolvedHost]:
+    """Resolves a batch of names from synchronous code; returns {name: ResolvedHost}."""
+    resolver = AsyncResolver(nameservers, concurrency=concurrency, timeout=timeout, retries=retries)
+    return asyncio.run(resolver.resolve_many(names))
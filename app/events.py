@@ -0,0 +1,153 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import wait
+from typing import Any, Dict, List, Optional, Set
+
+from google.cloud import pubsub_v1
+
+from app.findings import KIND_HOST, KIND_PORT, KIND_SUBDOMAIN, findings_index_enabled, get_findings_store
+from app.models import ToolOutput
+
+logger = logging.getLogger(__name__)
+
+EVENT_TOOL_COMPLETE = "tool_complete"
+EVENT_HOST_DISCOVERED = "host_discovered"
+EVENT_RECON_COMPLETE = "recon_complete"
+
+DEFAULT_MAX_MESSAGES = 100
+DEFAULT_MAX_LATENCY = 0.05
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_FLUSH_TIMEOUT = 60.0
+
+_publisher: Optional["ScanEventPublisher"] = None
+
+
+def progressive_events_enabled() -> bool:
+    """
+    Opt-in (RECON_PROGRESSIVE_EVENTS=true): subscribers of the scan topic otherwise only ever see recon_complete.
+    Set RECON_PROGRESSIVE_EVENTS_TOPIC to publish the progressive events to a topic of their own.
+    """
+    return os.getenv("RECON_PROGRESSIVE_EVENTS", "false").lower() in ("1", "true", "yes")
+
+
+def get_progressive_events_topic(default_topic_id: str) -> str:
+    return os.getenv("RECON_PROGRESSIVE_EVENTS_TOPIC") or default_topic_id
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+class ScanEventPublisher:
+    """
+    Publishes recon events to Pub/Sub as they happen instead of once at the end.
+    - Messages are batched by the client (RECON_PUBSUB_MAX_MESSAGES / _MAX_LATENCY / _MAX_BYTES)
+      and ordered per scan through the scan_id ordering key, so recon_complete arrives last.
+    - publish() never blocks on delivery; flush() waits for every outstanding message once, at shutdown.
+    - Every message carries "status" (the event type) as before, plus an "event_type" attribute,
+      so subscriptions sharing a topic with progressive events can filter on
+      attributes.event_type = "recon_complete".
+    """
+
+    def __init__(self, project_id: str, topic_id: str):
+        batch_settings = pubsub_v1.types.BatchSettings(
+            max_messages=int(_env_number("RECON_PUBSUB_MAX_MESSAGES", DEFAULT_MAX_MESSAGES)),
+            max_bytes=int(_env_number("RECON_PUBSUB_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            max_latency=_env_number("RECON_PUBSUB_MAX_LATENCY", DEFAULT_MAX_LATENCY),
+        )
+        publisher_options = pubsub_v1.types.PublisherOptions(enable_message_ordering=True)
+        self.client = pubsub_v1.PublisherClient(batch_settings=batch_settings, publisher_options=publisher_options)
+        self.topic_path = self.client.topic_path(project_id, topic_id)
+        self._futures: List[Any] = []
+        self._failed = 0
+        self._hosts_seen: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, scan_id: str, event_type: str, payload: Dict[str, Any]):
+        """Queues an event of a scan for publishing."""
+        data = json.dumps({"scan_id": scan_id, "status": event_type, **payload}).encode("utf-8")
+        try:
+            future = self.client.publish(self.topic_path, data, ordering_key=scan_id, event_type=event_type)
+        except Exception as e:
+            logger.error(f"Failed to queue {event_type} event for scan {scan_id}: {e}")
+            return
+        future.add_done_callback(lambda f: self._on_published(f, scan_id, event_type))
+        with self._lock:
+            self._futures.append(future)
+
+    def _on_published(self, future, scan_id: str, event_type: str):
+        error = future.exception()
+        if error is None:
+            logger.debug(f"Published {event_type} event {future.result()} for scan {scan_id}")
+            return
+        with self._lock:
+            self._failed += 1
+        logger.error(f"Failed to publish {event_type} event for scan {scan_id}: {error}")
+        # A failed message pauses its ordering key; resume so later events of the scan still go out.
+        self.client.resume_publish(self.topic_path, scan_id)
+
+    def publish_tool(self, scope_id: str, result: ToolOutput):
+        """
+        Publishes a tool_complete event once the tool's artifacts are uploaded, followed by a
+        host_discovered event for every host the tool found that no earlier tool of the scan reported.
+        """
+        scan_id = scope_id.split("/", 1)[0]
+        self.publish(scan_id, EVENT_TOOL_COMPLETE, {
+            "scope_id": scope_id,
+            "tool_name": result.tool_name,
+            "success": result.success,
+            "partial": result.partial,
+            "artifacts_uploaded": result.artifacts_uploaded,
+            "artifacts_prefix": f"data/{scope_id}/recon/{result.tool_name}/",
+            "targets": result.targets,
+        })
+        if result.success and findings_index_enabled():
+            for host, ports in self._new_hosts(scan_id, result.tool_name).items():
+                self.publish(scan_id, EVENT_HOST_DISCOVERED, {
+                    "host": host, "ports": sorted(ports), "tool_name": result.tool_name
+                })
+
+    def _new_hosts(self, scan_id: str, tool_name: str) -> Dict[str, Set[int]]:
+        hosts: Dict[str, Set[int]] = {}
+        for finding in get_findings_store().iter_findings(scan_id=scan_id, tool=tool_name):
+            if finding["kind"] in (KIND_HOST, KIND_SUBDOMAIN, KIND_PORT) and finding["host"]:
+                ports = hosts.setdefault(finding["host"], set())
+                if finding["kind"] == KIND_PORT and finding["port"]:
+                    ports.add(finding["port"])
+        with self._lock:
+            seen = self._hosts_seen.setdefault(scan_id, set())
+            new = {host: ports for host, ports in hosts.items() if host not in seen}
+            seen.update(new)
+        return new
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits for every published event. Returns False if any failed or the wait timed out."""
+        with self._lock:
+            futures = list(self._futures)
+        _, not_done = wait(futures, timeout=timeout or _env_number("RECON_PUBSUB_FLUSH_TIMEOUT", DEFAULT_FLUSH_TIMEOUT))
+        if not_done:
+            logger.error(f"{len(not_done)} of {len(futures)} events were still unpublished at shutdown")
+        logger.info(f"Published {len(futures) - len(not_done) - self._failed} of {len(futures)} events")
+        return not not_done and not self._failed
+
+
+def set_event_publisher(publisher: Optional[ScanEventPublisher]):
+    """Installs the publisher that receives progressive events of this process."""
+    global _publisher
+    _publisher = publisher
+
+
+def publish_tool_event(scope_id: str, result: ToolOutput):
+    """Publishes the events of a finished tool if a publisher is installed. Failures are logged, never raised."""
+    if _publisher is None:
+        return
+    try:
+        _publisher.publish_tool(scope_id, result)
+    except Exception:
+        logger.exception(f"Publishing events for {result.tool_name} failed")
@@ -0,0 +1,332 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+import itertools
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+from app.commands import option_value
+from app.handoff import parse_masscan_json
+from app.nmap_parser import iter_nmap_hosts
+from app.subdomains import normalize_hostname, scan_hostnames, scan_subfinder_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FINDINGS_DB = "/app/outputs/findings.sqlite3"
+INSERT_BATCH_SIZE = 1000
+
+KIND_HOST = "host"
+KIND_PORT = "port"
+KIND_SUBDOMAIN = "subdomain"
+KIND_URL = "url"
+KIND_TECHNOLOGY = "technology"
+
+_findings_extractors: Dict[str, Callable] = {}
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS findings (
+        id INTEGER PRIMARY KEY,
+        scan_id TEXT NOT NULL,
+        tool TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        host TEXT NOT NULL DEFAULT '',
+        port INTEGER NOT NULL DEFAULT 0,
+        protocol TEXT NOT NULL DEFAULT '',
+        value TEXT NOT NULL DEFAULT '',
+        detail TEXT,
+        created REAL NOT NULL,
+        UNIQUE (scan_id, tool, kind, host, port, protocol, value)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_findings_scan_kind ON findings (scan_id, kind)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_scan_host ON findings (scan_id, host)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_scan_port ON findings (scan_id, port)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_scan_tool ON findings (scan_id, tool)",
+    "CREATE INDEX IF NOT EXISTS idx_findings_host ON findings (host)",
+]
+
+_COLUMNS = ("scan_id", "tool", "kind", "host", "port", "protocol", "value", "detail")
+
+
+class Finding(NamedTuple):
+    kind: str
+    host: str = ""
+    port: int = 0
+    protocol: str = ""
+    value: str = ""
+    detail: Optional[Dict[str, Any]] = None
+
+
+def findings_index_enabled() -> bool:
+    return os.getenv("RECON_FINDINGS_INDEX", "true").lower() in ("1", "true", "yes")
+
+
+class FindingsStore:
+    """
+    Embedded SQLite (WAL) index of the normalized findings of every scan.
+    - One row per host, open port, subdomain, URL or technology, deduplicated per scan and tool.
+    - Indexed for lookups by scan, host, port, tool and kind; export() streams a scan out as JSON lines.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+                self._initialized = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, scan_id: str, tool: str, findings: Iterable[Finding]) -> int:
+        """Inserts findings in batches, skipping ones already recorded; returns the number of new rows."""
+        now = time.time()
+        rows = (
+            (scan_id, tool.lower(), f.kind, (f.host or "").lower(), f.port or 0, f.protocol or "", f.value or "",
+             json.dumps(f.detail) if f.detail else None, now)
+            for f in findings
+        )
+        inserted = 0
+        with closing(self._connect()) as conn:
+            while True:
+                batch = list(itertools.islice(rows, INSERT_BATCH_SIZE))
+                if not batch:
+                    break
+                with conn:
+                    before = conn.total_changes
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO findings (scan_id, tool, kind, host, port, protocol, value, detail, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch
+                    )
+                    inserted += conn.total_changes - before
+        return inserted
+
+    def copy(self, source_scan_id: str, scan_id: str, tool: str) -> int:
+        """Copies the findings one tool recorded for a scan to another scan; returns the number of new rows."""
+        columns = ", ".join(_COLUMNS[1:])
+        with closing(self._connect()) as conn, conn:
+            before = conn.total_changes
+            conn.execute(
+                f"INSERT OR IGNORE INTO findings (scan_id, {columns}, created) "
+                f"SELECT ?, {columns}, ? FROM findings WHERE scan_id = ? AND tool = ?",
+                (scan_id, time.time(), source_scan_id, tool.lower())
+            )
+            return conn.total_changes - before
+
+    def _select(self, scan_id: Optional[str], host: Optional[str], port: Optional[int], tool: Optional[str],
+                kind: Optional[str], limit: Optional[int], offset: int):
+        clauses, params = [], []
+        for column, value in (("scan_id", scan_id), ("host", host.lower() if host else None),
+                              ("port", port), ("tool", tool.lower() if tool else None), ("kind", kind)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM findings"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        return sql, params
+
+    def iter_findings(self, scan_id: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None,
+                      tool: Optional[str] = None, kind: Optional[str] = None, limit: Optional[int] = None,
+                      offset: int = 0) -> Iterator[Dict[str, Any]]:
+        sql, params = self._select(scan_id, host, port, tool, kind, limit, offset)
+        with closing(self._connect()) as conn:
+            for row in conn.execute(sql, params):
+                record = dict(row)
+                record["detail"] = json.loads(record["detail"]) if record["detail"] else None
+                yield record
+
+    def query(self, **filters) -> List[Dict[str, Any]]:
+        """Findings matching every given filter (scan_id, host, port, tool, kind), with limit/offset paging."""
+        return list(self.iter_findings(**filters))
+
+    def export(self, scan_id: str, output_path: str) -> int:
+        """Writes every finding of a scan to a JSON lines file; returns the number of rows."""
+        count = 0
+        with open(output_path, "w", encoding="utf-8") as out:
+            for record in self.iter_findings(scan_id=scan_id):
+                out.write(json.dumps(record) + "\n")
+                count += 1
+        return count
+
+
+_store: Optional[FindingsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_findings_store() -> FindingsStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FindingsStore(os.getenv("RECON_FINDINGS_DB", DEFAULT_FINDINGS_DB))
+        return _store
+
+
+# --- Extracting findings from tool output ---
+
+def register_findings_extractor(*tool_names: str) -> Callable:
+    """
+    A decorator to register the function that turns a tool's output files into findings.
+    Extractors take (command, output_dir) and yield Finding records.
+    """
+    def decorator(func: Callable) -> Callable:
+        for tool_name in tool_names:
+            _findings_extractors[tool_name.lower()] = func
+        return func
+    return decorator
+
+
+def _url_finding(url: str, detail: Optional[Dict[str, Any]] = None) -> Optional[Finding]:
+    parsed = urlparse(url)
+    if not parsed.hostname:
+        return None
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return Finding(KIND_URL, parsed.hostname, port, "tcp", url, detail)
+
+
+@register_findings_extractor("nmap")
+def nmap_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    xml_file = os.path.join(output_dir, "nmap_scan.xml")
+    if not os.path.exists(xml_file):
+        return
+    for host in iter_nmap_hosts(xml_file):
+        address = host.get("address", "")
+        yield Finding(KIND_HOST, address, value=host.get("status", ""),
+                      detail={k: host[k] for k in ("hostnames", "os", "mac") if k in host} or None)
+        for port in host.get("ports", []):
+            if port.get("state") not in ("open", "open|filtered"):
+                continue
+            detail = {k: port[k] for k in ("state", "service", "cpe", "scripts") if k in port}
+            yield Finding(KIND_PORT, address, port["port"], port.get("protocol", ""),
+                          port.get("service", {}).get("name", ""), detail)
+
+
+@register_findings_extractor("masscan")
+def masscan_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    json_file = os.path.join(output_dir, "masscan_scan.json")
+    if not os.path.exists(json_file):
+        return
+    for host, protocols in parse_masscan_json(json_file).items():
+        yield Finding(KIND_HOST, host, value="up")
+        for protocol, ports in protocols.items():
+            for port in ports:
+                yield Finding(KIND_PORT, host, port, protocol)
+
+
+def _subdomain_findings(names: Iterable[str]) -> Iterator[Finding]:
+    for name in names:
+        yield Finding(KIND_SUBDOMAIN, name, value=name)
+
+
+@register_findings_extractor("subfinder")
+def subfinder_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    json_file = os.path.join(output_dir, "subfinder_scan.json")
+    if os.path.exists(json_file):
+        yield from _subdomain_findings(scan_subfinder_json(json_file))
+
+
+@register_findings_extractor("amass", "dnsenum", "theharvester")
+def hostname_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    for filename in ("amass_scan.txt", "dnsenum_scan.xml", "theharvester_scan.json"):
+        path = os.path.join(output_dir, filename)
+        if os.path.exists(path):
+            yield from _subdomain_findings(set(scan_hostnames(path)))
+
+
+_GOBUSTER_LINE = re.compile(r"^(\S+)\s+\(Status:\s*(\d+)\)(?:\s+\[Size:\s*(\d+)\])?")
+
+
+@register_findings_extractor("gobuster")
+def gobuster_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    output_file = option_value(command, "-o")
+    base_url = (option_value(command, "-u") or "").rstrip("/")
+    if not output_file or not os.path.exists(output_file):
+        return
+    with open(output_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            match = _GOBUSTER_LINE.match(line)
+            if match and base_url:
+                finding = _url_finding(f"{base_url}/{match.group(1).lstrip('/')}",
+                                       {"status": int(match.group(2)), "size": int(match.group(3) or 0)})
+                if finding:
+                    yield finding
+            elif line.startswith("Found:") and len(line.split()) > 1:
+                name = normalize_hostname(line.split()[1])
+                if name:
+                    yield Finding(KIND_SUBDOMAIN, name, value=name)
+
+
+@register_findings_extractor("dirsearch")
+def dirsearch_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    # "200     2KB  http://target/admin/"
+    output_file = option_value(command, "-o")
+    if not output_file or not os.path.exists(output_file):
+        return
+    with open(output_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or line.startswith("#") or not parts[0].isdigit():
+                continue
+            url = next((p for p in parts if p.startswith(("http://", "https://"))), None)
+            finding = _url_finding(url, {"status": int(parts[0]), "size": parts[1]}) if url else None
+            if finding:
+                yield finding
+
+
+_WHATWEB_PLUGIN = re.compile(r"\s*([^,\[\]]+?)\s*((?:\[[^\]]*\])*)\s*(?:,|$)")
+
+
+@register_findings_extractor("whatweb")
+def whatweb_findings(command: List[str], output_dir: str) -> Iterator[Finding]:
+    # --log-brief: "http://target [200 OK] Apache[2.4.41], Country[UNITED STATES][US], HTML5, ..."
+    path = os.path.join(output_dir, "whatweb_scan.txt")
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            url, _, rest = line.strip().partition(" ")
+            status, _, plugins = rest.partition("] ")
+            url_finding = _url_finding(url, {"status": status.lstrip("[")} if status else None)
+            if not url_finding:
+                continue
+            yield url_finding
+            for match in _WHATWEB_PLUGIN.finditer(plugins):
+                if not match.group(1):
+                    continue
+                info = re.findall(r"\[([^\]]*)\]", match.group(2))
+                yield Finding(KIND_TECHNOLOGY, url_finding.host, url_finding.port, "tcp",
+                              match.group(1), {"info": info} if info else None)
+
+
+def index_findings(scan_id: str, tool_name: str, command: List[str], output_dir: str):
+    """
+    Writes the findings of a finished run into the findings store, under the top-level scan id.
+    Failures are logged, never raised.
+    """
+    extractor = _findings_extractors.get(tool_name.lower())
+    if not extractor or not findings_index_enabled():
+        return
+    try:
+        added = get_findings_store().add(scan_id.split("/", 1)[0], tool_name, extractor(command, output_dir))
+        logger.info(f"Indexed {added} findings from {tool_name}")
+    except Exception:
+        logger.exception(f"Indexing findings of {tool_name} failed")
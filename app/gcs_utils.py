@@ -1,39 +1,282 @@
 import os
 import logging
 import shutil
+import time
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import storage
 
+from app.compression import CompressedArtifact, decompress_bytes, get_compression_codec, should_compress
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_CAS_PREFIX = "data/cas/sha256"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class UploadResult(NamedTuple):
+    local_path: str
+    blob_name: str
+    success: bool
+    error: Optional[str] = None
+    original_bytes: Optional[int] = None
+    stored_bytes: Optional[int] = None
+    seconds_saved: Optional[float] = None
+
+
+class StoreStats(NamedTuple):
+    original_bytes: int
+    stored_bytes: int
+    seconds_saved: float
+
+
+def get_upload_parallelism() -> int:
+    """Reads the number of concurrent uploads from GCS_UPLOAD_WORKERS."""
+    try:
+        return max(1, int(os.getenv("GCS_UPLOAD_WORKERS", DEFAULT_UPLOAD_WORKERS)))
+    except ValueError:
+        logger.warning("Invalid GCS_UPLOAD_WORKERS value, using default.")
+        return DEFAULT_UPLOAD_WORKERS
+
+
+def _build_http_session(credentials) -> requests.Session:
+    """Builds an HTTP session whose connection pool can serve every upload worker."""
+    if credentials is None:
+        session = requests.Session()
+    else:
+        from google.auth.transport.requests import AuthorizedSession
+        session = AuthorizedSession(credentials)
+    pool_size = get_upload_parallelism()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _create_gcs_client():
+    # STORAGE_EMULATOR_HOST points the client at a local fake GCS server, without credentials.
+    if os.getenv("STORAGE_EMULATOR_HOST"):
+        return storage.Client(_http=_build_http_session(None))
+
+    import google.auth
+    credentials, project = google.auth.default()
+    return storage.Client(project=project, credentials=credentials, _http=_build_http_session(credentials))
+
+
 def get_gcs_client():
-    """Initializes and returns a GCS storage client."""
+    """Returns the shared GCS storage client, creating it on first use."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = _create_gcs_client()
+            except Exception as e:
+                logger.error(f"Failed to initialize GCS client: {e}")
+                return None
+    return _client
+
+
+def content_addressing_enabled() -> bool:
+    """Reads GCS_CONTENT_ADDRESSED; content-addressed storage is on unless disabled."""
+    return os.getenv("GCS_CONTENT_ADDRESSED", "true").lower() in ("1", "true", "yes")
+
+
+def file_sha256(local_file_path: str) -> str:
+    """Hashes a file in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(local_file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _encoded_artifact(local_file_path: str, codec: Optional[str]) -> Iterator[Optional[CompressedArtifact]]:
+    """Yields a compressed copy of the file when a codec is configured and compression pays off, else None."""
+    if codec and should_compress(local_file_path):
+        with CompressedArtifact(local_file_path, codec) as artifact:
+            if artifact.worthwhile:
+                yield artifact
+                return
+    yield None
+
+
+def _store_file(blob, local_file_path: str, artifact: Optional[CompressedArtifact], **upload_kwargs) -> StoreStats:
+    """
+    Uploads a local file to a blob, or its compressed copy when one is given.
+    Compressed blobs carry Content-Encoding so readers can decode them transparently.
+    """
+    original_bytes = os.path.getsize(local_file_path)
+    if artifact is not None:
+        blob.content_encoding = artifact.codec
+        blob.metadata = {"uncompressed-bytes": str(original_bytes)}
+        content_type = mimetypes.guess_type(local_file_path)[0] or "text/plain"
+        started = time.monotonic()
+        blob.upload_from_filename(artifact.path, content_type=content_type, **upload_kwargs)
+        saved = artifact.seconds_saved(time.monotonic() - started)
+        logger.info(
+            f"Compressed {local_file_path} with {artifact.codec}: {original_bytes} -> {artifact.compressed_bytes} bytes "
+            f"(ratio {artifact.ratio:.1f}x, compression {artifact.compress_seconds:.2f}s, est. {saved:.2f}s saved)"
+        )
+        return StoreStats(original_bytes, artifact.compressed_bytes, saved)
+
+    blob.upload_from_filename(local_file_path, **upload_kwargs)
+    return StoreStats(original_bytes, original_bytes, 0.0)
+
+
+def _upload_direct(bucket, local_file_path: str, blob_names: List[str], codec: Optional[str]) -> List[UploadResult]:
+    results = []
     try:
-        storage_client = storage.Client()
-        return storage_client
+        with _encoded_artifact(local_file_path, codec) as artifact:
+            for destination_blob_name in blob_names:
+                try:
+                    stats = _store_file(bucket.blob(destination_blob_name), local_file_path, artifact)
+                    logger.info(f"Successfully uploaded {local_file_path} to gs://{bucket.name}/{destination_blob_name}")
+                    results.append(UploadResult(local_file_path, destination_blob_name, True, None, *stats))
+                except Exception as e:
+                    logger.error(f"Failed to upload {local_file_path} to GCS: {e}")
+                    results.append(UploadResult(local_file_path, destination_blob_name, False, str(e)))
     except Exception as e:
-        logger.error(f"Failed to initialize GCS client: {e}")
-        return None
+        logger.error(f"Failed to compress {local_file_path}: {e}")
+        return [UploadResult(local_file_path, name, False, str(e)) for name in blob_names]
+    return results
+
+
+def _upload_content_addressed(bucket, local_file_path: str, blob_names: List[str], codec: Optional[str]) -> List[UploadResult]:
+    """
+    Uploads a file once under its SHA-256 and creates every logical path as a server-side copy.
+    The stored object is named after the encoding it was actually stored with (`<sha256>.<codec>` or
+    `<sha256>`), so a file whose compression did not pay off is never stored raw under a compressed name.
+    Content already stored by an earlier scan, in either form, is not uploaded again.
+    """
+    stats = StoreStats(None, None, None)
+    try:
+        base_name = f"{os.getenv('GCS_CAS_PREFIX', DEFAULT_CAS_PREFIX)}/{file_sha256(local_file_path)}"
+        candidates = [f"{base_name}.{codec}", base_name] if codec and should_compress(local_file_path) else [base_name]
+        cas_blob = next((blob for blob in map(bucket.blob, candidates) if blob.exists()), None)
+        if cas_blob is not None:
+            logger.info(f"Reusing stored artifact gs://{bucket.name}/{cas_blob.name} for {local_file_path}")
+        else:
+            with _encoded_artifact(local_file_path, codec) as artifact:
+                cas_blob = bucket.blob(f"{base_name}.{artifact.codec}" if artifact else base_name)
+                try:
+                    stats = _store_file(cas_blob, local_file_path, artifact, if_generation_match=0)
+                    logger.info(f"Successfully uploaded {local_file_path} to gs://{bucket.name}/{cas_blob.name}")
+                except PreconditionFailed:
+                    # Another worker stored the same content first.
+                    pass
+    except Exception as e:
+        logger.error(f"Failed to upload {local_file_path} to GCS: {e}")
+        return [UploadResult(local_file_path, name, False, str(e)) for name in blob_names]
+
+    results = []
+    for destination_blob_name in blob_names:
+        try:
+            # Server-side copies keep the Content-Encoding and metadata of the stored object.
+            bucket.copy_blob(cas_blob, bucket, destination_blob_name)
+            logger.info(f"Copied gs://{bucket.name}/{cas_blob.name} to gs://{bucket.name}/{destination_blob_name}")
+            results.append(UploadResult(local_file_path, destination_blob_name, True, None, *stats))
+        except Exception as e:
+            logger.error(f"Failed to copy {cas_blob.name} to {destination_blob_name}: {e}")
+            results.append(UploadResult(local_file_path, destination_blob_name, False, str(e)))
+    return results
+
+
+def upload_files_to_gcs(manifest: List[Tuple[str, str]], max_workers: int = None) -> List[UploadResult]:
+    """
+    Uploads a batch of (local path, blob name) pairs concurrently over the shared client.
+    Each distinct local file is read and sent once; with GCS_CONTENT_ADDRESSED (the default)
+    it is stored under its content hash and the blob names are created as server-side copies.
+    Text artifacts are compressed first when GCS_COMPRESSION is set.
+    Returns one UploadResult per manifest entry, in manifest order.
+    """
+    if not manifest:
+        return []
+
+    def fail_all(reason: str) -> List[UploadResult]:
+        return [UploadResult(path, blob_name, False, reason) for path, blob_name in manifest]
 
-def upload_file_to_gcs(local_file_path: str, destination_blob_name: str):
-    """Uploads a single file to the specified GCS bucket and blob name."""
     client = get_gcs_client()
     if not client:
-        return False
+        return fail_all("GCS client unavailable")
 
     bucket_name = os.getenv("GCS_BUCKET_NAME")
     if not bucket_name:
         logger.error("GCS_BUCKET_NAME environment variable not set.")
-        return False
+        return fail_all("GCS_BUCKET_NAME not set")
+
+    bucket = client.bucket(bucket_name)
+    upload = _upload_content_addressed if content_addressing_enabled() else _upload_direct
+    codec = get_compression_codec()
+
+    destinations = OrderedDict()
+    for path, blob_name in manifest:
+        destinations.setdefault(path, []).append(blob_name)
+
+    workers = min(max_workers or get_upload_parallelism(), len(destinations))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcs-upload") as executor:
+        grouped = executor.map(lambda item: upload(bucket, *item, codec), destinations.items())
+        by_entry = {(r.local_path, r.blob_name): r for results in grouped for r in results}
+
+    return [by_entry[entry] for entry in manifest]
+
+
+def upload_file_to_gcs(local_file_path: str, destination_blob_name: str):
+    """Uploads a single file to the specified GCS bucket and blob name."""
+    return upload_files_to_gcs([(local_file_path, destination_blob_name)])[0].success
 
+
+def copy_artifact_prefix(source_prefix: str, destination_prefix: str) -> Optional[int]:
+    """
+    Copies every blob under source_prefix to the same relative name under destination_prefix,
+    server-side. Returns the number of blobs copied, or None if the copy failed.
+    """
+    client = get_gcs_client()
+    bucket_name = os.getenv("GCS_BUCKET_NAME")
+    if not client or not bucket_name:
+        return None
     try:
         bucket = client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(local_file_path)
-        logger.info(f"Successfully uploaded {local_file_path} to gs://{bucket_name}/{destination_blob_name}")
-        return True
+        copied = 0
+        for blob in client.list_blobs(bucket_name, prefix=source_prefix):
+            bucket.copy_blob(blob, bucket, destination_prefix + blob.name[len(source_prefix):])
+            copied += 1
+        logger.info(f"Copied {copied} artifacts from gs://{bucket_name}/{source_prefix} to {destination_prefix}")
+        return copied
     except Exception as e:
-        logger.error(f"Failed to upload {local_file_path} to GCS: {e}")
-        return False
+        logger.error(f"Failed to copy gs://{bucket_name}/{source_prefix} to {destination_prefix}: {e}")
+        return None
+
+
+def download_artifact_bytes(blob_name: str) -> Optional[bytes]:
+    """Downloads an artifact from the bucket, decoding gzip/zstd compression if present."""
+    client = get_gcs_client()
+    bucket_name = os.getenv("GCS_BUCKET_NAME")
+    if not client or not bucket_name:
+        return None
+    try:
+        blob = client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            return None
+        return decompress_bytes(blob.download_as_bytes(), blob.content_encoding)
+    except Exception as e:
+        logger.error(f"Failed to download gs://{bucket_name}/{blob_name}: {e}")
+        return None
+
 
 def delete_local_directory(directory_path: str):
     """Safely deletes a local directory and all its contents."""
@@ -44,4 +287,4 @@ def delete_local_directory(directory_path: str):
         shutil.rmtree(directory_path)
         logger.info(f"Successfully deleted local directory: {directory_path}")
     except Exception as e:
-        logger.error(f"Failed to delete local directory {directory_path}: {e}")
\ No newline at end of file
+        logger.error(f"Failed to delete local directory {directory_path}: {e}")
@@ -0,0 +1,95 @@
+import os
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_handoff_registry: Dict[str, Callable] = {}
+
+
+def register_handoff(tool_name: str) -> Callable:
+    """
+    A decorator to register a handoff extractor for a tool.
+    Extractors run inline after a successful run, before post-processing uploads and
+    deletes the tool directory, so that later tools of the same scan can consume the results.
+    """
+    def decorator(func: Callable) -> Callable:
+        _handoff_registry[tool_name.lower()] = func
+        return func
+    return decorator
+
+
+def run_handoff(scan_id: str, tool_name: str, output_dir: str):
+    """Runs the handoff extractor for a tool, if it has one. Failures are logged, never raised."""
+    extractor = _handoff_registry.get(tool_name.lower())
+    if not extractor:
+        return
+    try:
+        extractor(scan_id, tool_name, output_dir)
+    except Exception:
+        logger.exception(f"Handoff extraction for {tool_name} failed")
+
+
+def get_handoff_path(scan_id: str, filename: str) -> str:
+    """Location of a handoff file; it lives outside the per-tool directories that get cleaned up."""
+    handoff_dir = os.path.join("/app", "outputs", scan_id, "handoff")
+    os.makedirs(handoff_dir, exist_ok=True)
+    return os.path.join(handoff_dir, filename)
+
+
+def masscan_handoff_enabled() -> bool:
+    return os.getenv("RECON_MASSCAN_HANDOFF", "true").lower() in ("1", "true", "yes")
+
+
+def parse_masscan_json(json_file: str) -> Dict[str, Dict[str, List[int]]]:
+    """
+    Streams masscan -oJ output and returns {host: {protocol: [open ports]}}.
+    masscan writes one record per line and older versions leave a trailing comma
+    before the closing bracket, so records are parsed line by line.
+    """
+    open_ports: Dict[str, Dict[str, set]] = {}
+    with open(json_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if not line.startswith("{"):
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed masscan record: {line[:200]}")
+                continue
+            host = record.get("ip")
+            for port in record.get("ports", []):
+                if host and port.get("status", "open") == "open" and "port" in port:
+                    protocols = open_ports.setdefault(host, {})
+                    protocols.setdefault(port.get("proto", "tcp"), set()).add(int(port["port"]))
+    return {
+        host: {proto: sorted(ports) for proto, ports in protocols.items()}
+        for host, protocols in open_ports.items()
+    }
+
+
+@register_handoff("masscan")
+def handoff_masscan(scan_id: str, tool_name: str, output_dir: str):
+    """Publishes the open host:port pairs found by masscan for the nmap builder."""
+    json_file = os.path.join(output_dir, "masscan_scan.json")
+    if not os.path.exists(json_file):
+        logger.warning(f"Masscan JSON output not found at {json_file}, no ports handed off to nmap")
+        return
+    open_ports = parse_masscan_json(json_file)
+    with open(get_handoff_path(scan_id, "masscan_open_ports.json"), "w", encoding="utf-8") as f:
+        json.dump(open_ports, f)
+    logger.info(f"Handed off {sum(len(p) for h in open_ports.values() for p in h.values())} open ports "
+                f"on {len(open_ports)} hosts from masscan")
+
+
+def load_masscan_handoff(scan_id: str) -> Optional[Dict[str, Dict[str, List[int]]]]:
+    """Returns the masscan results of the same scan, or None if masscan did not run or failed."""
+    if not masscan_handoff_enabled():
+        return None
+    path = os.path.join("/app", "outputs", scan_id, "handoff", "masscan_open_ports.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
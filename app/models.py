@@ -12,9 +12,13 @@ class ToolExecutionRequest(BaseModel):
     parameters: List[ToolParameter] = Field(default_factory=list)
 
 class ScanRequest(BaseModel):
-    target: str = Field(..., description="The target IP address or hostname")
+    target: str = Field(..., description="The target IP address, hostname or CIDR range; several may be comma separated")
+    targets: List[str] = Field(default_factory=list, description="Additional targets scanned in the same job")
     tools: List[ToolExecutionRequest] = Field(..., description="List of tools and their parameters to run")
     scan_id: str = Field(..., description="A unique identifier for this scan from the API Gateway")
+    batch_size: Optional[int] = Field(None, description="Targets per invocation of multi-target tools (default RECON_BATCH_SIZE)")
+    use_cache: bool = Field(False, description="Opt in to reusing results of identical tool invocations from the last RECON_RESULT_CACHE_TTL seconds")
+    deadline: Optional[float] = Field(None, description="Seconds the whole scan may take (default RECON_SCAN_DEADLINE)")
 
     @validator('target')
     def target_must_be_valid(cls, v):
@@ -30,11 +34,23 @@ class ToolOutput(BaseModel):
     stderr: str
     output_file_paths: List[str] = Field(default_factory=list)
     success: bool
+    artifacts_uploaded: Optional[bool] = None
+    partial: bool = False
+    targets: List[str] = Field(default_factory=list)
+    fingerprint: Optional[str] = None
+    cached_from: Optional[str] = None
+
+class TargetToolResult(BaseModel):
+    tool_name: str
+    success: bool
+    findings: List[str] = Field(default_factory=list)
 
 class ScanResponse(BaseModel):
     scan_id: str
     target: str
     target_domain: Optional[str] = None
+    targets: List[str] = Field(default_factory=list)
     results: List[ToolOutput]
+    target_results: Dict[str, List[TargetToolResult]] = Field(default_factory=dict)
     message: str
     status: str
\ No newline at end of file
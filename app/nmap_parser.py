@@ -0,0 +1,162 @@
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from defusedxml.ElementTree import iterparse, ParseError
+
+logger = logging.getLogger(__name__)
+
+MAX_SCRIPT_OUTPUT = 2000
+MAX_OS_MATCHES = 3
+SERVICE_FIELDS = ("name", "product", "version", "extrainfo", "ostype", "tunnel")
+MAX_REPORTED_PROBLEMS = 20
+
+
+def _compact(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Drops empty values so records only carry what nmap actually reported."""
+    return {key: value for key, value in record.items() if value not in (None, "", [], {})}
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _scripts(parent) -> List[Dict[str, str]]:
+    scripts = []
+    for script in parent.findall("script"):
+        output = (script.get("output") or "").strip()
+        if len(output) > MAX_SCRIPT_OUTPUT:
+            output = output[:MAX_SCRIPT_OUTPUT] + "...[truncated]"
+        scripts.append(_compact({"id": script.get("id"), "output": output}))
+    return scripts
+
+
+def _port_record(port) -> Dict[str, Any]:
+    """Raises ValueError if the port has no usable port number."""
+    number = _int(port.get("portid"))
+    if number is None:
+        raise ValueError(f"invalid portid {port.get('portid')!r}")
+    state = port.find("state")
+    service = port.find("service")
+    return _compact({
+        "port": number,
+        "protocol": port.get("protocol"),
+        "state": state.get("state") if state is not None else None,
+        "reason": state.get("reason") if state is not None else None,
+        "service": _compact({f: service.get(f) for f in SERVICE_FIELDS}) if service is not None else None,
+        "cpe": [cpe.text for cpe in service.findall("cpe")] if service is not None else None,
+        "scripts": _scripts(port),
+    })
+
+
+def host_record(host, problems: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Converts one <host> element into a compact {address, hostnames, status, ports, os, scripts} record.
+    Malformed ports are skipped; what was wrong with them is appended to `problems`.
+    """
+    addresses = {a.get("addrtype"): a.get("addr") for a in host.findall("address")}
+    status = host.find("status")
+    os_matches = [
+        _compact({"name": match.get("name"), "accuracy": _int(match.get("accuracy"))})
+        for match in host.findall("os/osmatch")[:MAX_OS_MATCHES]
+    ]
+    ports = []
+    for port in host.findall("ports/port"):
+        try:
+            ports.append(_port_record(port))
+        except (ValueError, TypeError, AttributeError) as e:
+            if problems is not None:
+                problems.append(f"Skipped port of host {addresses.get('ipv4') or addresses.get('ipv6')}: {e}")
+    return _compact({
+        "address": addresses.get("ipv4") or addresses.get("ipv6"),
+        "mac": addresses.get("mac"),
+        "hostnames": [h.get("name") for h in host.findall("hostnames/hostname")],
+        "status": status.get("state") if status is not None else None,
+        "ports": ports,
+        "os": os_matches,
+        "scripts": _scripts(host.find("hostscript")) if host.find("hostscript") is not None else None,
+    })
+
+
+class NmapXmlStream:
+    """
+    Streams an nmap XML report one <host> at a time.
+    Each host element is cleared once converted, so memory stays proportional to a single host
+    even for reports of hundreds of megabytes. Scan metadata and run statistics are collected
+    along the way and are complete once iteration finishes.
+    Malformed hosts and ports are skipped rather than aborting the report; `error` describes them.
+    """
+
+    def __init__(self, xml_path: str):
+        self.xml_path = xml_path
+        self.scan: Dict[str, Any] = {}
+        self.stats: Dict[str, Any] = {}
+        self.problems: List[str] = []
+
+    @property
+    def error(self) -> Optional[str]:
+        if not self.problems:
+            return None
+        shown = self.problems[:MAX_REPORTED_PROBLEMS]
+        more = len(self.problems) - len(shown)
+        return "; ".join(shown) + (f"; and {more} more problems" if more else "")
+
+    def hosts(self) -> Iterator[Dict[str, Any]]:
+        root = None
+        try:
+            for event, element in iterparse(self.xml_path, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = element
+                        self.scan = _compact({k: element.get(k) for k in ("scanner", "version", "args", "startstr")})
+                    continue
+                if element.tag == "host":
+                    try:
+                        record = host_record(element, self.problems)
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self.problems.append(f"Skipped malformed host: {e}")
+                        record = None
+                    element.clear()
+                    root.clear()
+                    if record is not None:
+                        yield record
+                elif element.tag == "finished":
+                    self.stats.update(_compact({k: element.get(k) for k in ("timestr", "elapsed", "exit", "summary")}))
+                elif element.tag == "hosts":
+                    self.stats.update(_compact({k: _int(element.get(k)) for k in ("up", "down", "total")}))
+        except ParseError as e:
+            # nmap was interrupted: everything up to the last complete host is still usable.
+            self.problems.append(f"Incomplete nmap XML: {e}")
+            logger.warning(f"Incomplete nmap XML: {e} ({self.xml_path})")
+        if self.problems:
+            logger.warning(f"{len(self.problems)} problems while parsing {self.xml_path}")
+
+
+def iter_nmap_hosts(xml_path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the compact record of every host in an nmap XML report."""
+    return NmapXmlStream(xml_path).hosts()
+
+
+def write_nmap_json(xml_path: str, json_path: str) -> int:
+    """
+    Converts an nmap XML report into a normalized JSON document
+    ({"scan": {...}, "hosts": [...], "stats": {...}}), writing hosts as they are parsed.
+    Returns the number of hosts written.
+    """
+    stream = NmapXmlStream(xml_path)
+    count = 0
+    with open(json_path, "w", encoding="utf-8") as out:
+        out.write('{"hosts": [')
+        for record in stream.hosts():
+            out.write(("," if count else "") + "\n" + json.dumps(record, separators=(",", ":")))
+            count += 1
+        out.write("\n]")
+        for key, value in (("scan", stream.scan), ("stats", stream.stats), ("error", stream.error)):
+            if value:
+                out.write(f', "{key}": {json.dumps(value)}')
+        out.write("}\n")
+    logger.info(f"Parsed {count} hosts from {xml_path}")
+    return count
@@ -0,0 +1,102 @@
+import os
+import queue
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POST_PROCESS_WORKERS = 2
+DEFAULT_POST_PROCESS_QUEUE = 8
+
+_STOP = object()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+class PostProcessingPipeline:
+    """
+    Background stage that runs post-processors (uploads and cleanup) while later tools execute.
+    - submit() blocks once RECON_POST_PROCESS_QUEUE jobs are waiting, which bounds local disk usage.
+    - RECON_POST_PROCESS_WORKERS threads consume the queue.
+    - drain() waits for every submitted job; use it before the scan results are published.
+    - wait_for(key) waits for the jobs submitted under a key, e.g. before a tool writes again to the
+      output directory a previous run's post-processor is still uploading and deleting.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None):
+        self.workers = workers or _env_int("RECON_POST_PROCESS_WORKERS", DEFAULT_POST_PROCESS_WORKERS)
+        self._queue = queue.Queue(maxsize=max_pending or _env_int("RECON_POST_PROCESS_QUEUE", DEFAULT_POST_PROCESS_QUEUE))
+        self._threads = [
+            threading.Thread(target=self._work, name=f"post-process-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        self._pending_keys: Counter = Counter()
+        self._keys_changed = threading.Condition()
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, label: str, job: Callable[[], bool], on_done: Optional[Callable[[bool], None]] = None,
+               key: Optional[Hashable] = None):
+        """Queues a post-processing job; on_done receives whether it succeeded."""
+        logger.info(f"Queued post-processing for {label}")
+        with self._keys_changed:
+            self._pending_keys[key] += 1
+        self._queue.put((label, job, on_done, key))
+
+    def wait_for(self, key: Hashable):
+        """Blocks until no job submitted under key is queued or running."""
+        with self._keys_changed:
+            if self._pending_keys[key]:
+                logger.info(f"Waiting for pending post-processing of {key}")
+            self._keys_changed.wait_for(lambda: not self._pending_keys[key])
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                label, job, on_done, key = item
+                try:
+                    succeeded = bool(job())
+                except Exception:
+                    logger.exception(f"Post-processing for {label} failed")
+                    succeeded = False
+                try:
+                    if on_done:
+                        on_done(succeeded)
+                except Exception:
+                    logger.exception(f"Completion callback of post-processing for {label} failed")
+                finally:
+                    with self._keys_changed:
+                        self._pending_keys[key] -= 1
+                        if not self._pending_keys[key]:
+                            del self._pending_keys[key]
+                        self._keys_changed.notify_all()
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """Blocks until every queued job has finished."""
+        self._queue.join()
+
+    def close(self):
+        self.drain()
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self) -> "PostProcessingPipeline":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import socket
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from app.commands import option_value, replace_option
+from app.sharding import GOBUSTER_DEFAULT_THREADS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PPS = 10000
+DEFAULT_MAX_RPS = 200
+# Requests/second one whatweb thread is assumed to make, to turn a rate into a thread count.
+WHATWEB_RPS_PER_THREAD = 5
+WHATWEB_DEFAULT_THREADS = 25
+# masscan's own rate when --rate is not given.
+MASSCAN_DEFAULT_RATE = 100
+# A lease outlives its tool's timeout by this much before other nodes consider it abandoned.
+LEASE_GRACE_SECONDS = 60
+DEFAULT_LEASE_TTL = 3600
+# A tool is not started below this share of its pool; it waits for leases to be released first.
+MIN_POOL_SHARE = 0.05
+DEFAULT_MAX_WAIT = 60
+WAIT_INTERVAL = 1.0
+
+POOL_PACKETS = "packets"
+POOL_HTTP = "http"
+
+_rate_appliers: Dict[str, Callable] = {}
+_tool_pools: Dict[str, str] = {}
+
+
+class Lease(NamedTuple):
+    lease_id: str
+    pool: str
+    rate: float
+
+
+def get_state_dir() -> Optional[str]:
+    """The lease directory (RECON_GOVERNOR_DIR); it must be shared by every worker on the node, e.g. a hostPath."""
+    return os.getenv("RECON_GOVERNOR_DIR") or None
+
+
+def governor_enabled() -> bool:
+    """Opt-in (RECON_RATE_GOVERNOR), and only with an explicitly configured shared RECON_GOVERNOR_DIR."""
+    if os.getenv("RECON_RATE_GOVERNOR", "false").lower() not in ("1", "true", "yes"):
+        return False
+    if not get_state_dir():
+        logger.warning("RECON_RATE_GOVERNOR is set but RECON_GOVERNOR_DIR is not, rate governor disabled.")
+        return False
+    return True
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+def get_pool_budgets() -> Dict[str, float]:
+    """Node-wide budgets: packets/s for raw-socket scanners (RECON_NODE_MAX_PPS), requests/s for HTTP tools (RECON_NODE_MAX_RPS)."""
+    return {
+        POOL_PACKETS: _env_number("RECON_NODE_MAX_PPS", DEFAULT_MAX_PPS),
+        POOL_HTTP: _env_number("RECON_NODE_MAX_RPS", DEFAULT_MAX_RPS),
+    }
+
+
+def get_max_wait() -> float:
+    """Seconds a tool waits for its pool to free up (RECON_GOVERNOR_WAIT) before running at the minimum share."""
+    return _env_number("RECON_GOVERNOR_WAIT", DEFAULT_MAX_WAIT)
+
+
+def register_rate_applier(tool_name: str, pool: str) -> Callable:
+    """
+    A decorator to register how a tool's command is limited to a rate from a pool.
+    Appliers take (command, rate) and return the command with the tool's rate or thread options set,
+    never raising a limit the command already had below the allocation.
+    """
+    def decorator(func: Callable) -> Callable:
+        _rate_appliers[tool_name.lower()] = func
+        _tool_pools[tool_name.lower()] = pool
+        return func
+    return decorator
+
+
+def _cap_option(command: List[str], flag: str, limit: int, default: Optional[float] = None) -> List[str]:
+    """Sets `flag` to `limit` unless the command's value, or the tool's `default` when unset, is already lower."""
+    current = option_value(command, flag)
+    try:
+        if float(current if current is not None else default) <= limit:
+            return command
+    except (TypeError, ValueError):
+        pass
+    return replace_option(command, flag, str(limit))
+
+
+@register_rate_applier("masscan", POOL_PACKETS)
+def limit_masscan(command: List[str], rate: float) -> List[str]:
+    # Without --rate masscan sends 100 packets/s; the allocation must never raise that.
+    return _cap_option(command, "--rate", max(1, int(rate)), default=MASSCAN_DEFAULT_RATE)
+
+
+@register_rate_applier("nmap", POOL_PACKETS)
+def limit_nmap(command: List[str], rate: float) -> List[str]:
+    return _cap_option(command, "--max-rate", max(1, int(rate)))
+
+
+@register_rate_applier("dirsearch", POOL_HTTP)
+def limit_dirsearch(command: List[str], rate: float) -> List[str]:
+    return _cap_option(command, "--max-rate", max(1, int(rate)))
+
+
+def _delay_ms(value: Optional[str]) -> Optional[float]:
+    """A gobuster --delay value ("150ms", "1s", "1.5s") in milliseconds, or None if unset or unreadable."""
+    if not value:
+        return None
+    try:
+        if value.endswith("ms"):
+            return float(value[:-2])
+        return float(value.rstrip("s")) * 1000
+    except ValueError:
+        return None
+
+
+@register_rate_applier("gobuster", POOL_HTTP)
+def limit_gobuster(command: List[str], rate: float) -> List[str]:
+    # gobuster has no rate option: at most `rate` threads, each waiting between its requests.
+    threads = min(int(option_value(command, "-t") or GOBUSTER_DEFAULT_THREADS), max(1, int(rate)))
+    command = replace_option(command, "-t", str(threads))
+    delay_ms = int(threads * 1000 / max(rate, 1))
+    current = _delay_ms(option_value(command, "--delay"))
+    if current is None or current < delay_ms:
+        command = replace_option(command, "--delay", f"{delay_ms}ms")
+    return command
+
+
+@register_rate_applier("whatweb", POOL_HTTP)
+def limit_whatweb(command: List[str], rate: float) -> List[str]:
+    # whatweb has no rate option either: its thread count is scaled to the allocation.
+    threads = min(WHATWEB_DEFAULT_THREADS, max(1, int(rate / WHATWEB_RPS_PER_THREAD)))
+    flag = "-t" if option_value(command, "-t") is not None else "--max-threads"
+    return _cap_option(command, flag, threads)
+
+
+class RateGovernor:
+    """
+    Shares node-wide packet and request rate budgets between every governed tool running on the node.
+    - Active leases live in a small JSON file guarded by an exclusive file lock, so every worker
+      process sharing the directory (RECON_GOVERNOR_DIR) sees the same state. Under Argo every pod has
+      its own outputs volume, so the directory must be mounted from the node (a hostPath) to coordinate anything.
+    - A starting tool gets an equal share of its pool among the active tools, but never more than what
+      the live leases leave of the budget, so the sum of the allocations stays within it. Allocations
+      are fixed when a tool starts: running tools are never rebalanced. When less than MIN_POOL_SHARE
+      is left the tool waits for leases to be released (up to RECON_GOVERNOR_WAIT) and then runs at
+      that share. The wait counts against the scan deadline; the tool's own timeout starts after it.
+    - Leases record their host and pid and expire after their tool's timeout plus a grace period.
+      Leases of dead processes on this host are purged right away; leases of other hosts sharing
+      the directory only when they expire.
+    """
+
+    def __init__(self, state_dir: str):
+        self.state_path = os.path.join(state_dir, "leases.json")
+        self.lock_path = os.path.join(state_dir, "leases.lock")
+        self.host = socket.gethostname()
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _live(self, lease: dict, now: float) -> bool:
+        if lease.get("expires", 0) < now:
+            return False
+        return lease.get("host") != self.host or _process_alive(lease["pid"])
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict[str, dict]]:
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    leases = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                leases = {}
+            now = time.time()
+            leases = {lease_id: lease for lease_id, lease in leases.items() if self._live(lease, now)}
+            yield leases
+            tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(leases, f)
+            os.replace(tmp_path, self.state_path)
+
+    def _try_acquire(self, tool_name: str, pool: str, budget: float, ttl: float, force: bool) -> Optional[Lease]:
+        with self._locked_state() as leases:
+            active = [lease for lease in leases.values() if lease["pool"] == pool]
+            remaining = budget - sum(lease["rate"] for lease in active)
+            rate = min(budget / (len(active) + 1), remaining)
+            if rate < budget * MIN_POOL_SHARE:
+                if not force:
+                    return None
+                rate = budget * MIN_POOL_SHARE
+            now = time.time()
+            lease_id = f"{self.host}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+            leases[lease_id] = {"pool": pool, "tool": tool_name, "host": self.host, "pid": os.getpid(),
+                                "rate": rate, "started": now, "expires": now + ttl}
+        logger.info(f"Rate governor: {tool_name} gets {rate:.0f}/s of the {budget:.0f}/s {pool} budget "
+                    f"({len(active)} other tools active, {max(0, remaining):.0f}/s unallocated)")
+        return Lease(lease_id, pool, rate)
+
+    def acquire(self, tool_name: str, pool: str, ttl: float = DEFAULT_LEASE_TTL) -> Lease:
+        """Allocates a rate from `pool` for a process expected to run at most `ttl` seconds."""
+        budget = get_pool_budgets()[pool]
+        give_up_at = time.monotonic() + get_max_wait()
+        while True:
+            force = time.monotonic() >= give_up_at
+            lease = self._try_acquire(tool_name, pool, budget, ttl, force)
+            if lease is not None:
+                if force:
+                    logger.warning(f"Rate governor: the {pool} budget is still allocated, "
+                                   f"{tool_name} runs at the minimum share and may exceed it")
+                return lease
+            time.sleep(WAIT_INTERVAL)
+
+    def release(self, lease: Lease):
+        with self._locked_state() as leases:
+            leases.pop(lease.lease_id, None)
+
+    def active(self) -> Dict[str, dict]:
+        with self._locked_state() as leases:
+            return dict(leases)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+_governor: Optional[RateGovernor] = None
+
+
+def get_rate_governor() -> RateGovernor:
+    global _governor
+    if _governor is None:
+        _governor = RateGovernor(get_state_dir())
+    return _governor
+
+
+@contextmanager
+def governed(tool_name: str, command: List[str], timeout: Optional[float] = None) -> Iterator[List[str]]:
+    """
+    Holds a rate lease for one process of a tool and yields its command limited to the allocation.
+    The lease expires LEASE_GRACE_SECONDS after the process' `timeout`, in case it is never released.
+    Tools without a rate applier, or any governor failure, leave the command unchanged.
+    """
+    applier = _rate_appliers.get(tool_name.lower())
+    if not applier or not governor_enabled():
+        yield command
+        return
+    try:
+        lease = get_rate_governor().acquire(tool_name, _tool_pools[tool_name.lower()],
+                                           (timeout or DEFAULT_LEASE_TTL) + LEASE_GRACE_SECONDS)
+        limited = applier(command, lease.rate)
+    except Exception:
+        logger.exception(f"Rate governor unavailable, running {tool_name} with its own rate")
+        yield command
+        return
+    try:
+        yield limited
+    finally:
+        try:
+            get_rate_governor().release(lease)
+        except Exception:
+            logger.exception(f"Releasing the rate lease of {tool_name} failed")
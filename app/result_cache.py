@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import List, NamedTuple, Optional, Tuple
+
+from app.findings import findings_index_enabled, get_findings_store
+from app.gcs_utils import copy_artifact_prefix
+from app.handoff import get_handoff_path
+from app.models import ToolOutput
+
+logger = logging.getLogger(__name__)
+
+OUTPUTS_DIR = os.path.join("/app", "outputs")
+DEFAULT_CACHE_DIR = os.path.join(OUTPUTS_DIR, "result_cache")
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+SCOPE_PLACEHOLDER = "{scope}"
+SCOPE_ID_PLACEHOLDER = "{scope_id}"
+
+# Ranked wordlists are rebuilt whenever hits are recorded; the words they contain only change with the source list.
+_RANKED_REVISION = re.compile(r"(\.ranked-\w+)-r\d+(\.txt)$")
+
+
+class CacheEntry(NamedTuple):
+    fingerprint: str
+    tool_name: str
+    scope_id: str
+    created: float
+    result_json: str
+
+
+def get_cache_ttl() -> float:
+    """Seconds a result stays reusable (RECON_RESULT_CACHE_TTL); 0 disables the cache."""
+    try:
+        return max(0.0, float(os.getenv("RECON_RESULT_CACHE_TTL", DEFAULT_TTL)))
+    except ValueError:
+        logger.warning("Invalid RECON_RESULT_CACHE_TTL value, using default.")
+        return DEFAULT_TTL
+
+
+def get_max_entries() -> int:
+    try:
+        return max(1, int(os.getenv("RECON_RESULT_CACHE_MAX", DEFAULT_MAX_ENTRIES)))
+    except ValueError:
+        logger.warning("Invalid RECON_RESULT_CACHE_MAX value, using default.")
+        return DEFAULT_MAX_ENTRIES
+
+
+def pop_cache_bypass(parameters: List) -> Tuple[bool, List]:
+    """Reads the logical '--no-cache' parameter and returns it with the remaining parameters."""
+    bypass = False
+    remaining = []
+    for param in parameters:
+        flag = param.flag if hasattr(param, 'flag') else param.get('flag')
+        if flag == "--no-cache":
+            bypass = True
+            continue
+        remaining.append(param)
+    return bypass, remaining
+
+
+def _scope_dir(scope_id: str) -> str:
+    return os.path.join(OUTPUTS_DIR, scope_id)
+
+
+def _normalize_text(text: str, scope_id: str) -> str:
+    """Replaces the scan's directory, then any other mention of its id (e.g. a recon-ng workspace name)."""
+    return text.replace(_scope_dir(scope_id), SCOPE_PLACEHOLDER).replace(scope_id, SCOPE_ID_PLACEHOLDER)
+
+
+def _normalize_arg(arg: str, scope_id: str) -> str:
+    """Makes a command argument independent of the scan it was built for."""
+    if arg.startswith(_scope_dir(scope_id) + os.sep) and os.path.isfile(arg):
+        # Target lists, port lists and scripts written by the builder: what matters is their content.
+        with open(arg, "r", encoding="utf-8", errors="surrogateescape") as f:
+            content = _normalize_text(f.read(), scope_id)
+        digest = hashlib.sha256(content.encode("utf-8", errors="surrogateescape")).hexdigest()
+        return f"{_normalize_text(arg, scope_id)}#sha256={digest}"
+    return _RANKED_REVISION.sub(r"\1\2", _normalize_text(arg, scope_id))
+
+
+def result_fingerprint(tool_name: str, targets: List[str], command: List[str], scope_id: str) -> str:
+    """
+    Fingerprints a tool invocation from its normalized targets, the tool name and the command the
+    builder produced. Wordlist paths carry the digest of their source list, so a changed wordlist
+    changes the fingerprint; scan-specific paths and ids do not, in the command or in the files
+    the builder generated (such as recon-ng's workflow.rc with its per-scan workspace).
+    """
+    key = {
+        "tool": tool_name.lower(),
+        "targets": sorted({t.strip().lower().rstrip(".") for t in targets}),
+        "command": [_normalize_arg(arg, scope_id) for arg in command],
+    }
+    return hashlib.sha256(json.dumps(key, separators=(",", ":")).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Remembers successful tool runs by fingerprint so that an identical invocation within the TTL
+    reuses them instead of executing again.
+    - Entries live in a SQLite (WAL) file next to a snapshot of the handoff files the run produced.
+    - Artifacts are not copied locally: a hit copies the earlier run's blobs server-side.
+    - Expired entries are purged on writes, and the least recently used ones are evicted beyond
+      RECON_RESULT_CACHE_MAX entries.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, "cache.sqlite3")
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (fingerprint TEXT PRIMARY KEY, tool_name TEXT NOT NULL, "
+                "scope_id TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0, result TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+            self._initialized = True
+        return conn
+
+    def _snapshot_dir(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, "handoff", fingerprint)
+
+    def _remove(self, conn: sqlite3.Connection, fingerprints: List[str]):
+        conn.executemany("DELETE FROM results WHERE fingerprint = ?", ((fp,) for fp in fingerprints))
+        for fingerprint in fingerprints:
+            shutil.rmtree(self._snapshot_dir(fingerprint), ignore_errors=True)
+
+    def lookup(self, fingerprint: str) -> Optional[CacheEntry]:
+        """Returns the unexpired entry for a fingerprint and marks it used."""
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT fingerprint, tool_name, scope_id, created, result FROM results "
+                "WHERE fingerprint = ? AND expires > ?", (fingerprint, now)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE fingerprint = ?",
+                             (now, fingerprint))
+        return CacheEntry(*row) if row else None
+
+    def store(self, fingerprint: str, scope_id: str, result: ToolOutput, ttl: float):
+        """Records a successful run, snapshots its handoff files and evicts expired and surplus entries."""
+        snapshot_dir = self._snapshot_dir(fingerprint)
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        handoff_dir = os.path.join(_scope_dir(scope_id), "handoff")
+        tool_key = result.tool_name.lower()
+        if os.path.isdir(handoff_dir):
+            for filename in os.listdir(handoff_dir):
+                if tool_key in filename.lower():
+                    os.makedirs(snapshot_dir, exist_ok=True)
+                    shutil.copy2(os.path.join(handoff_dir, filename), os.path.join(snapshot_dir, filename))
+
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (fingerprint, tool_name, scope_id, created, expires, last_used, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, result.tool_name, scope_id, now, now + ttl, now, result.model_dump_json())
+            )
+            expired = [fp for (fp,) in conn.execute("SELECT fingerprint FROM results WHERE expires <= ?", (now,))]
+            surplus = [fp for (fp,) in conn.execute(
+                "SELECT fingerprint FROM results WHERE expires > ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (now, get_max_entries())
+            )]
+            self._remove(conn, expired + surplus)
+        if expired or surplus:
+            logger.info(f"Evicted {len(expired)} expired and {len(surplus)} least recently used cached results")
+
+    def evict(self, fingerprint: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            self._remove(conn, [fingerprint])
+
+    def restore(self, entry: CacheEntry, scope_id: str, tool_name: str) -> Optional[ToolOutput]:
+        """
+        Makes a cached run part of another scan: copies its artifacts, handoff files and findings,
+        and returns its ToolOutput with paths rewritten to the new scope.
+        Returns None (and drops the entry) if the earlier artifacts are gone.
+        """
+        copied = copy_artifact_prefix(f"data/{entry.scope_id}/recon/{entry.tool_name}/",
+                                      f"data/{scope_id}/recon/{tool_name}/")
+        if not copied:
+            logger.warning(f"Artifacts of cached {tool_name} run in {entry.scope_id} are unavailable, dropping it")
+            self.evict(entry.fingerprint)
+            return None
+
+        snapshot_dir = self._snapshot_dir(entry.fingerprint)
+        if os.path.isdir(snapshot_dir):
+            for filename in os.listdir(snapshot_dir):
+                shutil.copyfile(os.path.join(snapshot_dir, filename), get_handoff_path(scope_id, filename))
+
+        if findings_index_enabled():
+            get_findings_store().copy(entry.scope_id.split("/", 1)[0], scope_id.split("/", 1)[0], entry.tool_name)
+
+        old_dir, new_dir = _scope_dir(entry.scope_id), _scope_dir(scope_id)
+        result = ToolOutput.model_validate_json(entry.result_json)
+        result.tool_name = tool_name
+        result.command = [arg.replace(old_dir, new_dir) for arg in result.command]
+        result.output_file_paths = [path.replace(old_dir, new_dir) for path in result.output_file_paths]
+        result.artifacts_uploaded = True
+        result.cached_from = entry.scope_id
+        return result
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(os.getenv("RECON_RESULT_CACHE_DIR", DEFAULT_CACHE_DIR))
+        return _cache
+
+
+def reuse_result(fingerprint: str, scope_id: str, tool_name: str) -> Optional[ToolOutput]:
+    """Returns the cached result of an identical recent run, restored into scope_id. Failures are logged, never raised."""
+    if not get_cache_ttl():
+        return None
+    try:
+        cache = get_result_cache()
+        entry = cache.lookup(fingerprint)
+        if entry is None:
+            return None
+        result = cache.restore(entry, scope_id, tool_name)
+        if result is not None:
+            logger.info(f"Reusing {tool_name} result of {entry.scope_id} from {time.ctime(entry.created)}")
+        return result
+    except Exception:
+        logger.exception(f"Result cache lookup for {tool_name} failed")
+        return None
+
+
+def remember_result(scope_id: str, result: ToolOutput):
+    """
+    Caches a finished run if it can be reused: complete, uploaded, and from a scan's own scope.
+    Runs of multi-target scopes are not cached because their findings cannot be told apart per scope.
+    """
+    ttl = get_cache_ttl()
+    if not ttl or not result.fingerprint or result.cached_from or "/" in scope_id:
+        return
+    if not result.success or result.partial or result.artifacts_uploaded is not True or not result.command:
+        return
+    try:
+        get_result_cache().store(result.fingerprint, scope_id, result, ttl)
+    except Exception:
+        logger.exception(f"Caching the {result.tool_name} result failed")
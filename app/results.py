@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import fcntl
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTPUTS_DIR = os.path.join("/app", "outputs")
+FINAL_RESULTS_FILE = "final_results.json"
+RESULT_LOG_FILE = "results.jsonl"
+
+# Every log line is {"index":N,"tool_name":"...","result":{...}}; the prefix is matched without parsing the result.
+_RECORD_PREFIX = re.compile(rb'^\{"index":(\d+),"tool_name":("(?:[^"\\]|\\.)*"),"result":')
+
+
+class LogEntry(NamedTuple):
+    index: int
+    tool_name: str
+    offset: int
+    length: int
+
+
+def final_results_path(scan_id: str) -> str:
+    return os.path.join(OUTPUTS_DIR, scan_id, FINAL_RESULTS_FILE)
+
+
+def result_log_path(scan_id: str) -> str:
+    return os.path.join(OUTPUTS_DIR, scan_id, RESULT_LOG_FILE)
+
+
+class ResultLog:
+    """
+    Append-only JSON lines log of a scan's tool results.
+    - Each record is written and fsynced as soon as a tool finishes, so a crash loses nothing that completed.
+    - A tool index may be appended again (e.g. once its uploads finish); the last record wins.
+    - Readers can tail the file; compact() turns it into final_results.json.
+    - Writes hold an exclusive file lock, so tool tasks on several workers can share the log.
+    """
+
+    def __init__(self, scan_id: str):
+        self.scan_id = scan_id
+        self.path = result_log_path(scan_id)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._terminate_torn_line()
+
+    def _terminate_torn_line(self):
+        """After a crash mid-write, start the next record on a fresh line so it stays readable."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def append(self, index: int, tool_name: str, result_json: str):
+        prefix = json.dumps({"index": index, "tool_name": tool_name}, separators=(",", ":"))[:-1]
+        line = f'{prefix},"result":{result_json}}}\n'.encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def read_log(scan_id: str, tool_name: Optional[str] = None) -> List[LogEntry]:
+    """
+    Indexes the latest record of every tool in a scan's log, in tool order, optionally for one tool only.
+    Only record prefixes are decoded; a torn last line (crash mid-write) is ignored.
+    """
+    path = result_log_path(scan_id)
+    if not os.path.exists(path):
+        return []
+    latest: Dict[int, LogEntry] = {}
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            match = _RECORD_PREFIX.match(line)
+            if match and line.endswith(b"}\n"):
+                name = json.loads(match.group(2))
+                latest[int(match.group(1))] = LogEntry(int(match.group(1)), name, offset, len(line))
+            offset += len(line)
+    wanted = tool_name.lower() if tool_name else None
+    return [entry for _, entry in sorted(latest.items()) if not wanted or entry.tool_name.lower() == wanted]
+
+
+def iter_result_bytes(scan_id: str, entries: List[LogEntry]) -> Iterator[bytes]:
+    """Yields the raw ToolOutput JSON of each entry, read straight from the log."""
+    with open(result_log_path(scan_id), "rb") as f:
+        for entry in entries:
+            f.seek(entry.offset)
+            line = f.read(entry.length)
+            yield line[_RECORD_PREFIX.match(line).end():-2]
+
+
+def stream_results(scan_id: str, header: Dict[str, Any], entries: List[LogEntry]) -> Iterator[bytes]:
+    """Streams the header fields followed by a "results" array copied from the log."""
+    opening = json.dumps(header)[:-1]
+    yield (opening + (", " if header else "") + '"results": [').encode()
+    separator = b""
+    for body in iter_result_bytes(scan_id, entries):
+        yield separator + body
+        separator = b","
+    yield b"]}"
+
+
+def compact(scan_id: str, summary: Dict[str, Any]) -> str:
+    """
+    Writes final_results.json from the summary fields and the latest log record of every tool,
+    streaming results from the log rather than building the response in memory.
+    """
+    path = final_results_path(scan_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out:
+        for chunk in stream_results(scan_id, summary, read_log(scan_id)):
+            out.write(chunk)
+    os.replace(tmp_path, path)
+    return path
+
+
+def file_etag(path: str) -> str:
+    """An ETag from the file's size and modification time, so revalidation never reads the file."""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def log_etag(scan_id: str, *extra: object) -> str:
+    path = result_log_path(scan_id)
+    version = file_etag(path) if os.path.exists(path) else "empty"
+    return hashlib.sha1(repr((version, extra)).encode()).hexdigest()[:32]
@@ -0,0 +1,116 @@
+import os
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MAX_PARALLEL_TOOLS = 6
+
+
+def get_max_parallel_tools() -> int:
+    """Reads the tool concurrency limit from RECON_MAX_PARALLEL_TOOLS."""
+    try:
+        return max(1, int(os.getenv("RECON_MAX_PARALLEL_TOOLS", DEFAULT_MAX_PARALLEL_TOOLS)))
+    except ValueError:
+        logger.warning("Invalid RECON_MAX_PARALLEL_TOOLS value, using default.")
+        return DEFAULT_MAX_PARALLEL_TOOLS
+
+
+class ToolScheduler:
+    """
+    Runs the tools of a scan concurrently, up to max_workers at a time.
+    - Jobs may carry a scope (the scan id prefix their files live under, see plan_invocations);
+      without scopes every job is in the scan's single scope.
+    - A tool waits for the tools listed in its run_after that run in the same scope, or for all of
+      their jobs if none does.
+    - Repeated entries of the same tool in the same scope run in request order, since they share an
+      output directory; entries in different scopes run independently.
+    - Results are returned in the order the tools were requested.
+    """
+
+    def __init__(self, dependency_resolver: Callable[[str], List[str]], max_workers: int = None):
+        self.dependency_resolver = dependency_resolver
+        self.max_workers = max_workers or get_max_parallel_tools()
+
+    def build_dependencies(self, tool_names: List[str], scopes: Optional[List[str]] = None) -> Dict[int, Set[int]]:
+        """Maps each job index to the job indexes it has to wait for."""
+        names = [name.lower() for name in tool_names]
+        scopes = scopes or [""] * len(names)
+        by_scope: Dict[Tuple[str, str], List[int]] = {}
+        by_name: Dict[str, List[int]] = {}
+        for index, name in enumerate(names):
+            by_scope.setdefault((scopes[index], name), []).append(index)
+            by_name.setdefault(name, []).append(index)
+
+        dependencies: Dict[int, Set[int]] = {index: set() for index in range(len(names))}
+        for (scope, name), indexes in by_scope.items():
+            # Each repeated entry waits for the previous one, which waited for the one before.
+            for previous, index in zip(indexes, indexes[1:]):
+                dependencies[index].add(previous)
+            for required in set(self.dependency_resolver(name)):
+                if required == name:
+                    continue
+                waits_for = by_scope.get((scope, required), by_name.get(required, []))
+                for index in indexes:
+                    dependencies[index].update(waits_for)
+        return dependencies
+
+    def stages(self, tool_names: List[str], scopes: Optional[List[str]] = None) -> List[List[int]]:
+        """
+        Groups job indexes into stages that can run together: every job only waits for jobs of earlier stages.
+        Used where jobs are dispatched as batches rather than scheduled one by one.
+        """
+        dependencies = self.build_dependencies(tool_names, scopes)
+        stages: List[List[int]] = []
+        completed: Set[int] = set()
+        while len(completed) < len(tool_names):
+            stage = [i for i in sorted(dependencies) if i not in completed and dependencies[i] <= completed]
+            if not stage:
+                blocked = [tool_names[i] for i in sorted(set(dependencies) - completed)]
+                raise RuntimeError(f"Circular tool ordering detected between: {blocked}")
+            stages.append(stage)
+            completed.update(stage)
+        return stages
+
+    def run(self, tool_names: List[str], run_job: Callable[[int], T], scopes: Optional[List[str]] = None) -> List[T]:
+        """
+        Executes run_job(index) for every tool and returns the results by index.
+        run_job is expected to handle its own errors and always return a result.
+        """
+        dependencies = self.build_dependencies(tool_names, scopes)
+        dependents: Dict[int, List[int]] = {index: [] for index in dependencies}
+        for index, required in dependencies.items():
+            for other in required:
+                dependents[other].append(index)
+        waiting = {index: len(required) for index, required in dependencies.items()}
+        ready = [index for index, count in waiting.items() if not count]
+        heapq.heapify(ready)
+        results: Dict[int, T] = {}
+        running = {}
+
+        logger.info(f"Scheduling {len(tool_names)} tools with up to {self.max_workers} in parallel")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool") as executor:
+            while len(results) < len(tool_names):
+                while ready and len(running) < self.max_workers:
+                    index = heapq.heappop(ready)
+                    logger.info(f"Starting tool '{tool_names[index]}'")
+                    running[executor.submit(run_job, index)] = index
+
+                if not running:
+                    blocked = [tool_names[i] for i in sorted(set(dependencies) - set(results))]
+                    raise RuntimeError(f"Circular tool ordering detected between: {blocked}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    results[index] = future.result()
+                    for dependent in dependents[index]:
+                        waiting[dependent] -= 1
+                        if not waiting[dependent]:
+                            heapq.heappush(ready, dependent)
+
+        return [results[i] for i in range(len(tool_names))]
@@ -0,0 +1,145 @@
+import os
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from app.commands import option_value, replace_option
+from app.streaming import TailBuffer
+from app.wordlists import open_wordlist
+from app.wordlist_ranking import ranked_head_size
+
+logger = logging.getLogger(__name__)
+
+SHARDABLE_TOOLS = {"gobuster", "dirsearch"}
+GOBUSTER_DEFAULT_THREADS = 10
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+def pop_shard_count(tool_name: str, parameters: List) -> Tuple[int, List]:
+    """
+    Reads the logical '--shards' parameter (falling back to RECON_BRUTEFORCE_SHARDS) and
+    returns it with the remaining parameters. Tools that cannot be sharded always get 1.
+    """
+    shards = int(_env_number("RECON_BRUTEFORCE_SHARDS", 1))
+    remaining = []
+    for param in parameters:
+        flag = param.flag if hasattr(param, 'flag') else param.get('flag')
+        value = param.value if hasattr(param, 'value') else param.get('value')
+        if flag == "--shards":
+            try:
+                shards = int(value)
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring invalid --shards value: {value}")
+            continue
+        remaining.append(param)
+    if tool_name.lower() not in SHARDABLE_TOOLS:
+        return 1, remaining
+    return max(1, shards), remaining
+
+
+def _shard_rate(command: List[str], tool_name: str, shards: int) -> Optional[float]:
+    """The per-shard requests/second budget, from dirsearch --max-rate or RECON_BRUTEFORCE_MAX_RPS."""
+    total = _env_number("RECON_BRUTEFORCE_MAX_RPS", 0)
+    if tool_name.lower() == "dirsearch" and option_value(command, "--max-rate"):
+        total = float(option_value(command, "--max-rate"))
+    return total / shards if total > 0 else None
+
+
+def build_shard_commands(command: List[str], tool_name: str, shards: int, shards_dir: str) -> List[List[str]]:
+    """
+    Derives one command per shard: each reads every shards-th word of the wordlist (so a ranked list's
+    head is spread over all shards), writes to its own output file and gets an equal share of the
+    request-rate budget.
+    Raises ValueError if the command has no wordlist or output file to split.
+    """
+    wordlist_path = option_value(command, "-w")
+    output_path = option_value(command, "-o")
+    if not wordlist_path or not output_path:
+        raise ValueError("command has no -w wordlist or -o output file")
+
+    wordlist = open_wordlist(wordlist_path)
+    rate = _shard_rate(command, tool_name, shards)
+    commands = []
+    for index in range(shards):
+        shard_dir = os.path.join(shards_dir, str(index))
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_cmd = replace_option(command, "-w", wordlist.shard(index, shards, strided=True, directory=shard_dir))
+        shard_cmd = replace_option(shard_cmd, "-o", os.path.join(shard_dir, os.path.basename(output_path)))
+        if rate:
+            if tool_name.lower() == "dirsearch":
+                shard_cmd = replace_option(shard_cmd, "--max-rate", str(max(1, int(rate))))
+            elif option_value(shard_cmd, "--delay") is None:
+                # gobuster has no rate option: space each thread's requests so the shard stays within budget.
+                threads = int(option_value(shard_cmd, "-t") or GOBUSTER_DEFAULT_THREADS)
+                shard_cmd = replace_option(shard_cmd, "--delay", f"{int(threads * 1000 / rate)}ms")
+        commands.append(shard_cmd)
+    logger.info(f"Split {tool_name} into {shards} shards over {len(wordlist)} words")
+    return commands
+
+
+def build_budget_commands(command: List[str], segments_dir: str) -> Tuple[int, List[List[str]]]:
+    """
+    Splits a ranked wordlist run into two sequential commands: the head (words that hit before)
+    and the tail, each with its own output directory under segments_dir/0 and segments_dir/1.
+    Returns the head size with the commands; the head is empty if the list is not ranked.
+    Raises ValueError if the command has no wordlist or output file to split.
+    """
+    wordlist_path = option_value(command, "-w")
+    output_path = option_value(command, "-o")
+    if not wordlist_path or not output_path:
+        raise ValueError("command has no -w wordlist or -o output file")
+
+    wordlist = open_wordlist(wordlist_path)
+    head_size = ranked_head_size(wordlist_path) or 0
+    commands = []
+    for index, (start, stop) in enumerate([(0, head_size), (head_size, len(wordlist))]):
+        segment_dir = os.path.join(segments_dir, str(index))
+        os.makedirs(segment_dir, exist_ok=True)
+        segment_cmd = replace_option(command, "-w", wordlist.segment(start, stop, directory=segment_dir))
+        commands.append(replace_option(segment_cmd, "-o", os.path.join(segment_dir, os.path.basename(output_path))))
+    return head_size, commands
+
+
+def _merge_files(sources: List[str], destination: str, dedupe: bool) -> TailBuffer:
+    """
+    Concatenates files line by line, optionally dropping repeated lines; returns the tail of the result.
+    Repeated lines are recognized by an 8-byte digest, so memory does not grow with line length.
+    """
+    tail = TailBuffer()
+    seen = set()
+    with open(destination, "wb") as out:
+        for source in sources:
+            if not os.path.exists(source):
+                continue
+            with open(source, "rb") as f:
+                for line in f:
+                    if dedupe:
+                        digest = hashlib.blake2b(line, digest_size=8).digest()
+                        if digest in seen:
+                            continue
+                        seen.add(digest)
+                    out.write(line)
+                    tail.write(line)
+    return tail
+
+
+def merge_shard_outputs(command: List[str], shards: int, shards_dir: str, output_dir: str) -> Tuple[str, str]:
+    """
+    Merges shard results into the tool directory: the -o file and stdout are deduplicated,
+    stderr is concatenated. Returns the stdout and stderr tails for the ToolOutput.
+    """
+    shard_dirs = [os.path.join(shards_dir, str(i)) for i in range(shards)]
+    output_name = os.path.basename(option_value(command, "-o"))
+    _merge_files([os.path.join(d, output_name) for d in shard_dirs], option_value(command, "-o"), dedupe=True)
+    stdout_tail = _merge_files([os.path.join(d, "output.stdout") for d in shard_dirs],
+                               os.path.join(output_dir, "output.stdout"), dedupe=True)
+    stderr_tail = _merge_files([os.path.join(d, "output.stderr") for d in shard_dirs],
+                               os.path.join(output_dir, "output.stderr"), dedupe=False)
+    return stdout_tail.text(), stderr_tail.text()
@@ -0,0 +1,171 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 256
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_FLUSH_TIMEOUT = 30.0
+REQUEST_TIMEOUT = 5
+
+# Key of a pending update: (scan_id, tool_name), with tool_name None for the scan itself.
+UpdateKey = Tuple[str, Optional[str]]
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+class StatusReporter:
+    """
+    Delivers scan and tool status updates to the gateway from a background thread.
+    - report() only records the update: a newer state of the same scan or tool replaces one
+      that has not been sent yet, so the queue holds at most one update per key.
+    - Updates are sent over one pooled requests.Session; when RECON_STATUS_BATCH_PATH is set,
+      tool updates waiting together go out in a single request.
+    - Failed deliveries are retried with exponential backoff unless a newer state arrived meanwhile.
+    - flush() waits until everything reported so far was delivered or given up on; call it
+      (or close()) before exiting so terminal states are not lost.
+    """
+
+    def __init__(self, base_url: str, max_pending: int = None, max_attempts: int = None,
+                 batch_path: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_pending = max_pending or int(_env_number("RECON_STATUS_MAX_PENDING", DEFAULT_MAX_PENDING))
+        self.max_attempts = max_attempts or int(_env_number("RECON_STATUS_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self.batch_path = batch_path if batch_path is not None else os.getenv("RECON_STATUS_BATCH_PATH")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._pending: "OrderedDict[UpdateKey, Dict[str, Any]]" = OrderedDict()
+        self._attempts: Dict[UpdateKey, int] = {}
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._work, name="status-reporter", daemon=True)
+        self._thread.start()
+
+    def report_scan(self, scan_id: str, status: str):
+        self.report((scan_id, None), {"scan_id": scan_id, "status": status})
+
+    def report_tool(self, scan_id: str, tool_name: str, status: str, timestamp: str):
+        self.report((scan_id, tool_name), {"scan_id": scan_id, "tool_name": tool_name, "status": status,
+                                           "timestamp": timestamp})
+
+    def report(self, key: UpdateKey, payload: Dict[str, Any]):
+        """Queues an update, replacing an unsent one for the same key. Blocks only while the queue is full."""
+        with self._condition:
+            if key in self._pending:
+                logger.debug(f"Status {self._pending[key]['status']} of {key} superseded by {payload['status']}")
+                self._pending.pop(key)
+            else:
+                while len(self._pending) >= self.max_pending and not self._closed:
+                    self._condition.wait()
+            self._attempts.pop(key, None)
+            self._pending[key] = payload
+            self._condition.notify_all()
+
+    def _take(self) -> List[Tuple[UpdateKey, Dict[str, Any]]]:
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            updates = list(self._pending.items())
+            self._pending.clear()
+            self._in_flight = len(updates)
+            self._condition.notify_all()
+            return updates
+
+    def _work(self):
+        while True:
+            updates = self._take()
+            if not updates:
+                return
+            failed, deferred = self._send(updates)
+            with self._condition:
+                # Back to the front of the queue, in their original order, unless a newer state arrived.
+                for key, payload in reversed(failed + deferred):
+                    if key in self._pending:
+                        continue
+                    if (key, payload) in failed:
+                        attempts = self._attempts.get(key, 0) + 1
+                        if attempts >= self.max_attempts:
+                            logger.error(f"Giving up on status {payload['status']} for {key} after {attempts} attempts")
+                            self._attempts.pop(key, None)
+                            continue
+                        self._attempts[key] = attempts
+                    self._pending[key] = payload
+                    self._pending.move_to_end(key, last=False)
+                self._in_flight = 0
+                self._condition.notify_all()
+            if failed:
+                attempts = max(self._attempts.get(key, 1) for key, _ in failed)
+                time.sleep(min(30.0, 2 ** (attempts - 1)) + random.random() * 0.5)
+
+    def _send(self, updates: List[Tuple[UpdateKey, Dict[str, Any]]]):
+        """
+        Delivers tool updates, then scan updates. Returns the updates that failed and the scan updates
+        held back because a tool update of the same scan failed, so a scan never looks finished
+        before its tools do.
+        """
+        tool_updates = [(key, payload) for key, payload in updates if key[1] is not None]
+        scan_updates = [(key, payload) for key, payload in updates if key[1] is None]
+        if self.batch_path and len(tool_updates) > 1:
+            if self._post(self.batch_path, {"updates": [payload for _, payload in tool_updates]}):
+                tool_updates = []
+
+        failed = [(key, payload) for key, payload in tool_updates
+                  if not self._post("/tool/status", payload)]
+        failed_scans = {key[0] for key, _ in failed}
+        deferred = [(key, payload) for key, payload in scan_updates if key[0] in failed_scans]
+        failed += [(key, payload) for key, payload in scan_updates
+                   if key[0] not in failed_scans and not self._post("/scan/status", payload)]
+        return failed, deferred
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> bool:
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=REQUEST_TIMEOUT)
+            if path == self.batch_path and response.status_code in (404, 405):
+                logger.warning(f"Gateway does not accept batched status updates at {path}, sending them one by one")
+                self.batch_path = None
+                return False
+            response.raise_for_status()
+            logger.info(f"Delivered status update {payload.get('status')} to {path}")
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to deliver status update to {path}: {e}")
+            return False
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until every reported update was delivered or given up on. Returns False on timeout."""
+        deadline = time.monotonic() + (timeout or _env_number("RECON_STATUS_FLUSH_TIMEOUT", DEFAULT_FLUSH_TIMEOUT))
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.error(f"Status reporter flush timed out with {len(self._pending)} updates pending")
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = None) -> bool:
+        """Flushes, then stops the background thread."""
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=REQUEST_TIMEOUT)
+        self.session.close()
+        return flushed
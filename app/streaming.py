@@ -0,0 +1,177 @@
+import os
+import signal
+import subprocess
+import threading
+import logging
+from typing import BinaryIO, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+TAIL_CHARS = 2000
+# Keep enough bytes to always decode TAIL_CHARS characters of multi-byte UTF-8.
+TAIL_BYTES = TAIL_CHARS * 4
+DEFAULT_KILL_GRACE = 10.0
+
+
+class TailBuffer:
+    """Fixed-size byte ring buffer that keeps only the last `size` bytes written to it."""
+
+    def __init__(self, size: int = TAIL_BYTES):
+        self.size = size
+        self._buffer = bytearray(size)
+        self._end = 0
+        self.total = 0
+
+    def write(self, chunk: bytes):
+        if len(chunk) >= self.size:
+            self._buffer[:] = chunk[-self.size:]
+            self._end = 0
+        else:
+            first = min(len(chunk), self.size - self._end)
+            self._buffer[self._end:self._end + first] = chunk[:first]
+            rest = len(chunk) - first
+            if rest:
+                self._buffer[:rest] = chunk[first:]
+            self._end = (self._end + len(chunk)) % self.size
+        self.total += len(chunk)
+
+    def getvalue(self) -> bytes:
+        if self.total < self.size:
+            return bytes(self._buffer[:self.total])
+        return bytes(self._buffer[self._end:] + self._buffer[:self._end])
+
+    def text(self, max_chars: int = TAIL_CHARS) -> str:
+        return self.getvalue().decode("utf-8", errors="replace")[-max_chars:]
+
+
+class StreamPump(threading.Thread):
+    """
+    Copies a child pipe to a file in fixed-size chunks.
+    - Keeps a tail of the stream for the ToolOutput summary.
+    - Passes every chunk to the registered listeners as it arrives.
+    """
+
+    def __init__(self, pipe: BinaryIO, file_path: str, listeners: Optional[List[Callable[[bytes], None]]] = None):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.file_path = file_path
+        self.listeners = listeners or []
+        self.tail = TailBuffer()
+        self.error: Optional[Exception] = None
+
+    def run(self):
+        try:
+            with open(self.file_path, "wb") as out:
+                while True:
+                    chunk = self.pipe.read1(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    self.tail.write(chunk)
+                    for listener in self.listeners:
+                        listener(chunk)
+        except Exception as e:
+            logger.error(f"Failed to stream output to {self.file_path}: {e}")
+            self.error = e
+            # Keep draining so the child never blocks on a full pipe.
+            while self.pipe.read1(CHUNK_SIZE):
+                pass
+        finally:
+            self.pipe.close()
+
+
+class StreamedProcessResult:
+    """Outcome of a streamed command: return code plus the output tails."""
+
+    def __init__(self, returncode: int, stdout_pump: StreamPump, stderr_pump: StreamPump):
+        self.returncode = returncode
+        self.stdout = stdout_pump.tail.text()
+        self.stderr = stderr_pump.tail.text()
+        self.stdout_bytes = stdout_pump.tail.total
+        self.stderr_bytes = stderr_pump.tail.total
+
+
+class StreamedTimeout(subprocess.TimeoutExpired):
+    """A streamed command overran its timeout; `result` holds whatever it wrote before it was stopped."""
+
+    def __init__(self, command: List[str], timeout: float, result: StreamedProcessResult):
+        super().__init__(command, timeout)
+        self.result = result
+
+
+def get_kill_grace() -> float:
+    """Seconds a timed-out tool gets between SIGTERM and SIGKILL (RECON_KILL_GRACE)."""
+    try:
+        return max(0.0, float(os.getenv("RECON_KILL_GRACE", DEFAULT_KILL_GRACE)))
+    except ValueError:
+        logger.warning("Invalid RECON_KILL_GRACE value, using default.")
+        return DEFAULT_KILL_GRACE
+
+
+def _signal_group(pgid: int, sig: int) -> bool:
+    """Signals a process group; returns False once no process is left in it."""
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError as e:
+        logger.warning(f"Cannot signal process group {pgid}: {e}")
+        return False
+
+
+def terminate_process_group(process: subprocess.Popen, grace: float):
+    """
+    Stops a command started in its own session together with everything it spawned:
+    SIGTERM to the whole group so tools can flush their output, then SIGKILL after `grace` seconds.
+    """
+    pgid = process.pid
+    if not _signal_group(pgid, signal.SIGTERM):
+        return
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    # Children may outlive the leader; whatever is left of the group gets killed.
+    if _signal_group(pgid, signal.SIGKILL):
+        logger.warning(f"Killed process group {pgid} after a {grace:.0f}s grace period")
+    process.wait()
+
+
+def run_streaming(command: List[str], stdout_file: str, stderr_file: str, timeout: float,
+                  cwd: Optional[str] = None,
+                  stdout_listeners: Optional[List[Callable[[bytes], None]]] = None,
+                  stderr_listeners: Optional[List[Callable[[bytes], None]]] = None) -> StreamedProcessResult:
+    """
+    Runs a command with its stdout/stderr streamed straight to files.
+    Memory use is bounded by the chunk and tail sizes, regardless of output volume.
+    The command runs in its own process group. If it overruns the timeout, the whole group is
+    terminated (SIGTERM, then SIGKILL) and StreamedTimeout is raised with the output written so far.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=False, cwd=cwd,
+                               start_new_session=True)
+    stdout_pump = StreamPump(process.stdout, stdout_file, stdout_listeners)
+    stderr_pump = StreamPump(process.stderr, stderr_file, stderr_listeners)
+    stdout_pump.start()
+    stderr_pump.start()
+
+    timed_out = False
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        logger.warning(f"{command[0]} overran its {timeout:.0f}s timeout, stopping its process group")
+        terminate_process_group(process, get_kill_grace())
+        returncode = process.returncode
+    finally:
+        if not timed_out:
+            # Background children left behind would keep the pipes open; stop them too.
+            _signal_group(process.pid, signal.SIGKILL)
+        stdout_pump.join()
+        stderr_pump.join()
+
+    result = StreamedProcessResult(returncode, stdout_pump, stderr_pump)
+    if timed_out:
+        raise StreamedTimeout(command, timeout, result)
+    return result
@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import heapq
+import itertools
+import logging
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from app.handoff import register_handoff, get_handoff_path
+from app.post_processing import recon_blob_path
+from app.gcs_utils import upload_files_to_gcs
+from app.dns_resolver import resolve_hosts
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_HOSTNAME_LENGTH = 253
+RESOLVE_BATCH_SIZE = 5000
+SORT_RUN_SIZE = 100000
+
+# Tools that discover subdomains, in the order they are listed in the aggregated artifact.
+SUBDOMAIN_TOOLS = ["amass", "subfinder", "dnsenum", "theharvester"]
+
+_HOSTNAME_RE = re.compile(r"(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,61}[a-z0-9]")
+_HOSTNAME_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789.-_*")
+
+
+def normalize_hostname(name: str) -> Optional[str]:
+    """Lowercases a name and strips wildcards and trailing dots; returns None if it is not a hostname."""
+    name = name.strip().lower().rstrip(".")
+    if name.startswith("*."):
+        name = name[2:]
+    if not name or len(name) > MAX_HOSTNAME_LENGTH or not _HOSTNAME_RE.fullmatch(name):
+        return None
+    return name
+
+
+def sort_key(name: str) -> str:
+    """Sorts names by their reversed labels so subdomains of the same parent stay together."""
+    return ".".join(reversed(name.split(".")))
+
+
+def in_scope(name: str, domain: str) -> bool:
+    return name == domain or name.endswith("." + domain)
+
+
+def scan_hostnames(file_path: str) -> Iterator[str]:
+    """
+    Yields every hostname-looking token of a text, JSON or XML file, reading it in chunks.
+    Works on files made of a single huge line (theHarvester JSON) as well.
+    """
+    carry = ""
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            window = carry + chunk.lower()
+            if chunk:
+                # Hold back a trailing partial token until the next chunk completes it.
+                cut = len(window)
+                while cut > 0 and window[cut - 1] in _HOSTNAME_CHARS and len(window) - cut < MAX_HOSTNAME_LENGTH:
+                    cut -= 1
+                window, carry = window[:cut], window[cut:]
+            for match in _HOSTNAME_RE.finditer(window):
+                name = normalize_hostname(match.group(0))
+                if name:
+                    yield name
+            if not chunk:
+                return
+
+
+def scan_subfinder_json(file_path: str) -> Iterator[str]:
+    """Yields the hosts of subfinder -oJ output (one JSON object per line)."""
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                host = json.loads(line).get("host", "")
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            name = normalize_hostname(host)
+            if name:
+                yield name
+
+
+def _write_run(names: Iterable[str], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for name in names:
+            f.write(name + "\n")
+
+
+def _read_run(path: str) -> Iterator[Tuple[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.rstrip("\n")
+            yield sort_key(name), name
+
+
+def write_sorted_names(names: Iterable[str], output_path: str) -> int:
+    """
+    Writes the unique names in sort_key order with an external sort: names are sorted in runs of
+    SORT_RUN_SIZE next to the output file, then the runs are k-way merged, so memory stays bounded
+    by the run size however many names a tool reports. Returns the number of unique names.
+    """
+    names = iter(names)
+    runs: List[str] = []
+    try:
+        while True:
+            chunk = sorted(set(itertools.islice(names, SORT_RUN_SIZE)), key=sort_key)
+            if not chunk:
+                break
+            runs.append(f"{output_path}.run{len(runs)}")
+            _write_run(chunk, runs[-1])
+
+        total = 0
+        with open(output_path, "w", encoding="utf-8") as out:
+            previous = None
+            for _, name in heapq.merge(*(_read_run(path) for path in runs)):
+                if name != previous:
+                    out.write(name + "\n")
+                    total += 1
+                    previous = name
+        return total
+    finally:
+        for path in runs:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _tool_names_path(scan_id: str, tool_name: str) -> str:
+    return get_handoff_path(scan_id, f"subdomains_{tool_name.lower()}.txt")
+
+
+def _extract(scan_id: str, tool_name: str, source: str, reader: Callable[[str], Iterator[str]]):
+    if not os.path.exists(source):
+        logger.warning(f"{tool_name} output not found at {source}, no subdomains extracted")
+        return
+    count = write_sorted_names(reader(source), _tool_names_path(scan_id, tool_name))
+    logger.info(f"Extracted {count} unique names from {tool_name} output")
+
+
+@register_handoff("amass")
+def handoff_amass(scan_id: str, tool_name: str, output_dir: str):
+    _extract(scan_id, tool_name, os.path.join(output_dir, "amass_scan.txt"), scan_hostnames)
+
+
+@register_handoff("subfinder")
+def handoff_subfinder(scan_id: str, tool_name: str, output_dir: str):
+    _extract(scan_id, tool_name, os.path.join(output_dir, "subfinder_scan.json"), scan_subfinder_json)
+
+
+@register_handoff("dnsenum")
+def handoff_dnsenum(scan_id: str, tool_name: str, output_dir: str):
+    _extract(scan_id, tool_name, os.path.join(output_dir, "dnsenum_scan.xml"), scan_hostnames)
+
+
+@register_handoff("theharvester")
+def handoff_theharvester(scan_id: str, tool_name: str, output_dir: str):
+    _extract(scan_id, tool_name, os.path.join(output_dir, "theharvester_scan.json"), scan_hostnames)
+
+
+def _read_names(tool_name: str, path: str) -> Iterator[Tuple[str, str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.rstrip("\n")
+            yield sort_key(name), name, tool_name
+
+
+def aggregate_subdomains(scan_id: str, domain: Optional[str]) -> Optional[str]:
+    """
+    Merges the per-tool name lists of a scan into one sorted, deduplicated artifact.
+    Each line is "<name>\\t<tool>,<tool>". The per-tool lists are already sorted, so they
+    are k-way merged and memory stays constant regardless of the number of names.
+    Names outside the target domain are dropped when the target is a domain.
+    Returns the artifact path, or None if no subdomain tool produced results.
+    """
+    sources = [(tool, _tool_names_path(scan_id, tool)) for tool in SUBDOMAIN_TOOLS]
+    sources = [(tool, path) for tool, path in sources if os.path.exists(path)]
+    if not sources:
+        return None
+
+    domain = normalize_hostname(domain) if domain else None
+    streams = [_read_names(tool, path) for tool, path in sources]
+    output_path = get_handoff_path(scan_id, "subdomains.txt")
+    total = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        def flush(name: Optional[str], found_by: List[str]):
+            nonlocal total
+            if name is not None and (not domain or in_scope(name, domain)):
+                out.write(f"{name}\t{','.join(found_by)}\n")
+                total += 1
+
+        current, found_by = None, []
+        for _, name, tool in heapq.merge(*streams):
+            if name != current:
+                flush(current, found_by)
+                current, found_by = name, []
+            if tool not in found_by:
+                found_by.append(tool)
+        flush(current, found_by)
+
+    logger.info(f"Aggregated {total} unique names from {[tool for tool, _ in sources]}")
+    return output_path
+
+
+def resolution_enabled() -> bool:
+    """Opt-in (RECON_RESOLVE_SUBDOMAINS): resolving every name delays the end of the scan."""
+    return os.getenv("RECON_RESOLVE_SUBDOMAINS", "false").lower() in ("1", "true", "yes")
+
+
+def resolve_subdomains(scan_id: str, artifact: str) -> str:
+    """
+    Resolves the aggregated names in batches and writes one JSON object per name
+    ({"name", "a", "aaaa", "cname", "ttl", "error"}) to handoff/resolved_subdomains.jsonl.
+    """
+    output_path = get_handoff_path(scan_id, "resolved_subdomains.jsonl")
+    resolved = 0
+    with open(artifact, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as out:
+        names = (line.split("\t", 1)[0] for line in src)
+        while True:
+            batch = list(itertools.islice(names, RESOLVE_BATCH_SIZE))
+            if not batch:
+                break
+            for host in resolve_hosts(batch).values():
+                out.write(json.dumps(host._asdict()) + "\n")
+                resolved += 0 if host.error else 1
+    logger.info(f"Resolved {resolved} discovered names for scan {scan_id}")
+    return output_path
+
+
+def run_subdomain_aggregation(scan_id: str, domain: Optional[str]) -> bool:
+    """Aggregates (and optionally resolves) the subdomains of a scan and uploads the artifacts."""
+    artifact = aggregate_subdomains(scan_id, domain)
+    if not artifact:
+        return True
+    manifest = [
+        (artifact, recon_blob_path(scan_id, "subdomains", "llm", "subdomains.txt")),
+        (artifact, recon_blob_path(scan_id, "subdomains", "review", "subdomains.txt")),
+    ]
+    if resolution_enabled():
+        resolved = resolve_subdomains(scan_id, artifact)
+        manifest.append((resolved, recon_blob_path(scan_id, "subdomains", "llm", "resolved_subdomains.jsonl")))
+        manifest.append((resolved, recon_blob_path(scan_id, "subdomains", "review", "resolved_subdomains.jsonl")))
+    return all(r.success for r in upload_files_to_gcs(manifest))
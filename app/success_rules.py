@@ -0,0 +1,120 @@
+import re
+from typing import Callable, Dict, Iterable, List, Set
+
+
+class MarkerScanner:
+    """
+    Incremental case-insensitive search for a fixed set of markers.
+    - All markers are compiled into one alternation regex, so each chunk is scanned once.
+    - The tail of the previous chunk is carried over so markers split across chunks are still found.
+    - Scanning stops once every marker has been seen.
+    """
+
+    def __init__(self, markers: Iterable[str]):
+        self.markers = sorted({m.lower().encode("utf-8") for m in markers}, key=len, reverse=True)
+        self.found: Set[bytes] = set()
+        self._pattern = re.compile(b"|".join(re.escape(m) for m in self.markers)) if self.markers else None
+        self._overlap = max((len(m) for m in self.markers), default=1) - 1
+        # A match only reports the longest marker at a position; record its prefixes too.
+        self._prefixes = {m: [p for p in self.markers if p != m and m.startswith(p)] for m in self.markers}
+        self._carry = b""
+
+    @property
+    def exhausted(self) -> bool:
+        return len(self.found) == len(self.markers)
+
+    def feed(self, chunk: bytes):
+        if self._pattern is None or self.exhausted:
+            return
+        window = self._carry + chunk.lower()
+        # Restart one byte after each match start so overlapping markers
+        # ("not found" inside "module not found") are all recorded.
+        position = 0
+        while not self.exhausted:
+            match = self._pattern.search(window, position)
+            if not match:
+                break
+            marker = match.group(0)
+            self.found.add(marker)
+            self.found.update(self._prefixes[marker])
+            position = match.start() + 1
+        self._carry = window[-self._overlap:] if self._overlap else b""
+
+    def seen_any(self, markers: Iterable[str]) -> bool:
+        return any(m.lower().encode("utf-8") in self.found for m in markers)
+
+
+class SuccessRule:
+    """
+    Declarative success criteria for a tool family.
+    - fatal_stderr: markers in stderr that fail the run.
+    - fatal_output: markers in stdout or stderr that fail the run.
+    - benign_stderr: markers that let a non-zero exit still count as success (when allowed).
+    """
+
+    def __init__(self, fatal_stderr: List[str] = None, fatal_output: List[str] = None,
+                 benign_stderr: List[str] = None, allow_benign_nonzero: bool = False):
+        self.fatal_stderr = fatal_stderr or []
+        self.fatal_output = fatal_output or []
+        self.benign_stderr = benign_stderr or []
+        self.allow_benign_nonzero = allow_benign_nonzero
+
+
+GENERIC_RULE = SuccessRule(
+    fatal_output=["invalid module", "invalid option", "invalid command", "error", "traceback",
+                  "no such file", "not found", "[!]", "fail", "module not found"]
+)
+
+_success_rules: Dict[str, SuccessRule] = {
+    "recon-ng": SuccessRule(fatal_stderr=["error", "traceback"]),
+    "dirsearch": SuccessRule(fatal_stderr=["error", "traceback"]),
+    "theharvester": SuccessRule(fatal_stderr=["error", "traceback"]),
+    # Allow partial success if dnsenum gave output but only benign errors
+    "dnsenum": SuccessRule(
+        fatal_stderr=["can't locate"],
+        benign_stderr=["query failed", "noerror", "lame server"],
+        allow_benign_nonzero=True,
+    ),
+}
+
+
+def get_success_rule(tool_name: str) -> SuccessRule:
+    """Retrieves the success rule for a tool, or the generic one."""
+    return _success_rules.get(tool_name.lower(), GENERIC_RULE)
+
+
+class OutputClassifier:
+    """
+    Single-pass success classifier fed by the output stream pumps.
+    Each stream gets its own scanner, so the stdout and stderr threads never share state.
+    """
+
+    def __init__(self, tool_name: str):
+        self.rule = get_success_rule(tool_name)
+        stdout_markers = self.rule.fatal_output
+        stderr_markers = self.rule.fatal_output + self.rule.fatal_stderr + self.rule.benign_stderr
+        self._stdout = MarkerScanner(stdout_markers) if stdout_markers else None
+        self._stderr = MarkerScanner(stderr_markers) if stderr_markers else None
+
+    @property
+    def stdout_listeners(self) -> List[Callable[[bytes], None]]:
+        return [self._stdout.feed] if self._stdout else []
+
+    @property
+    def stderr_listeners(self) -> List[Callable[[bytes], None]]:
+        return [self._stderr.feed] if self._stderr else []
+
+    def _stderr_has(self, markers: List[str]) -> bool:
+        return bool(self._stderr) and self._stderr.seen_any(markers)
+
+    def verdict(self, returncode: int) -> bool:
+        """Returns whether the run succeeded, once both streams have been fully consumed."""
+        rule = self.rule
+        found_error = self._stderr_has(rule.fatal_stderr + rule.fatal_output) or (
+            bool(self._stdout) and self._stdout.seen_any(rule.fatal_output)
+        )
+        if found_error:
+            return False
+        if returncode == 0:
+            return True
+        return rule.allow_benign_nonzero and self._stderr_has(rule.benign_stderr)
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import ipaddress
+import logging
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.handoff import get_handoff_path, parse_masscan_json
+from app.nmap_parser import iter_nmap_hosts
+from app.utils import is_ip_address, resolve_all
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_TARGETS = 4096
+
+# Tools that take address ranges as they are; every other tool gets CIDR ranges expanded to hosts.
+RANGE_TOOLS = {"nmap", "masscan"}
+
+_target_splitters: Dict[str, Callable] = {}
+
+
+def get_batch_size(requested: Optional[int] = None) -> int:
+    """Targets per invocation of a multi-target tool: the request's batch_size, else RECON_BATCH_SIZE."""
+    size = requested or int(os.getenv("RECON_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    return max(1, size)
+
+
+def get_max_targets() -> int:
+    return int(os.getenv("RECON_MAX_TARGETS", DEFAULT_MAX_TARGETS))
+
+
+def is_network(value: str) -> bool:
+    return "/" in value and _parse_network(value) is not None
+
+
+def _parse_network(value: str) -> Optional[ipaddress._BaseNetwork]:
+    try:
+        return ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+
+
+def parse_targets(target: str, targets: Optional[List[str]] = None) -> List[str]:
+    """
+    Collects the targets of a request: the comma or whitespace separated `target` string plus the
+    `targets` list, deduplicated in order. CIDR ranges are kept as ranges.
+    """
+    values = re.split(r"[,\s]+", target or "") + [t.strip() for t in targets or []]
+    return list(dict.fromkeys(v for v in values if v))
+
+
+def expand_for_tool(tool_name: str, targets: List[str]) -> List[str]:
+    """
+    Expands CIDR ranges into their hosts unless the tool scans ranges itself.
+    Raises ValueError if the expansion exceeds RECON_MAX_TARGETS.
+    """
+    if tool_name.lower() in RANGE_TOOLS:
+        return targets
+    expanded = []
+    for target in targets:
+        network = _parse_network(target) if "/" in target else None
+        if network is None:
+            expanded.append(target)
+            continue
+        if network.num_addresses > get_max_targets():
+            raise ValueError(f"{target} has more than {get_max_targets()} addresses (RECON_MAX_TARGETS)")
+        expanded.extend(str(host) for host in (network.hosts() if network.num_addresses > 2 else network))
+    if len(expanded) > get_max_targets():
+        raise ValueError(f"{len(expanded)} targets exceed RECON_MAX_TARGETS ({get_max_targets()})")
+    return list(dict.fromkeys(expanded))
+
+
+class Invocation(NamedTuple):
+    """One run of a tool: the targets it covers and the scope (scan id prefix) its files live under."""
+    tool_index: int
+    scope_id: str
+    targets: List[str]
+
+
+def plan_invocations(scan_id: str, tool_names: List[str], targets: List[str], batch_tools: List[str],
+                     batch_size: int) -> List[Invocation]:
+    """
+    Splits a multi-target scan into tool invocations.
+    - Tools in batch_tools get one invocation per chunk of batch_size targets, scoped to
+      <scan_id>/batch-NNNN, so tools chaining through handoff files (masscan, nmap) see the same chunks.
+    - Every other tool gets one invocation per target, scoped to <scan_id>/target-NNNN.
+    The targets of each scope are written to its handoff directory for splitting results back per target.
+    """
+    invocations = []
+    scopes: Dict[Tuple[str, ...], str] = {}
+    scope_counts = {"target": 0, "batch": 0}
+    for index, tool_name in enumerate(tool_names):
+        tool_targets = expand_for_tool(tool_name, targets)
+        if tool_name.lower() in batch_tools:
+            groups = [tool_targets[start:start + batch_size] for start in range(0, len(tool_targets), batch_size)]
+        else:
+            groups = [[target] for target in tool_targets]
+        for group_targets in groups:
+            # Identical target groups share a scope, whichever tools they come from.
+            key = tuple(group_targets)
+            if key not in scopes:
+                prefix = "target" if len(group_targets) == 1 else "batch"
+                scopes[key] = f"{scan_id}/{prefix}-{scope_counts[prefix]:04d}"
+                scope_counts[prefix] += 1
+            invocations.append(Invocation(index, scopes[key], group_targets))
+
+    for scope_targets, scope_id in scopes.items():
+        with open(get_handoff_path(scope_id, "targets.json"), "w", encoding="utf-8") as f:
+            json.dump(list(scope_targets), f)
+    logger.info(f"Planned {len(invocations)} tool invocations for {len(targets)} targets in {len(scopes)} scopes")
+    return invocations
+
+
+def masscan_addresses(targets: List[str]) -> List[str]:
+    """masscan only takes addresses and ranges: hostnames are replaced by everything they resolve to."""
+    addresses = []
+    for target in targets:
+        if is_ip_address(target) or is_network(target):
+            addresses.append(target)
+        else:
+            addresses.extend(resolve_all(target) or [target])
+    return list(dict.fromkeys(addresses))
+
+
+# --- Splitting batched results back per target ---
+
+def register_target_splitter(tool_name: str) -> Callable:
+    """
+    A decorator to register the function that splits a batched run's output per host.
+    Splitters take the tool's output directory and yield (host, finding) pairs.
+    """
+    def decorator(func: Callable) -> Callable:
+        _target_splitters[tool_name.lower()] = func
+        return func
+    return decorator
+
+
+class TargetMatcher:
+    """Maps a host seen in tool output (address or name) back to the requested target it belongs to."""
+
+    def __init__(self, targets: List[str]):
+        self.exact: Dict[str, str] = {}
+        self.networks: List[Tuple[ipaddress._BaseNetwork, str]] = []
+        for target in targets:
+            network = _parse_network(target) if "/" in target else None
+            if network is not None:
+                self.networks.append((network, target))
+                continue
+            self.exact[target.lower()] = target
+            if not is_ip_address(target):
+                for address in resolve_all(target):
+                    self.exact.setdefault(address, target)
+
+    def match(self, host: str) -> Optional[str]:
+        host = host.strip().strip("[]").lower().rstrip(".")
+        if host in self.exact:
+            return self.exact[host]
+        if is_ip_address(host):
+            address = ipaddress.ip_address(host)
+            for network, target in self.networks:
+                if address in network:
+                    return target
+        return None
+
+
+@register_target_splitter("nmap")
+def split_nmap(output_dir: str) -> Iterator[Tuple[str, str]]:
+    path = os.path.join(output_dir, "nmap_scan.xml")
+    if not os.path.exists(path):
+        return
+    for host in iter_nmap_hosts(path):
+        for port in host.get("ports", []):
+            finding = f"{port['port']}/{port.get('protocol')} {port.get('state', '')}"
+            if port.get("service", {}).get("name"):
+                finding += f" {port['service']['name']}"
+            for name in [host.get("address")] + host.get("hostnames", []):
+                if name:
+                    yield name, finding
+
+
+@register_target_splitter("masscan")
+def split_masscan(output_dir: str) -> Iterator[Tuple[str, str]]:
+    path = os.path.join(output_dir, "masscan_scan.json")
+    if not os.path.exists(path):
+        return
+    for host, protocols in parse_masscan_json(path).items():
+        for protocol, ports in protocols.items():
+            for port in ports:
+                yield host, f"{port}/{protocol} open"
+
+
+@register_target_splitter("whatweb")
+def split_whatweb(output_dir: str) -> Iterator[Tuple[str, str]]:
+    # --log-brief: "http://target [200 OK] Country[...], HTTPServer[nginx], ..."
+    path = os.path.join(output_dir, "whatweb_scan.txt")
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            host = urlparse(line.split(" ", 1)[0]).hostname if line else None
+            if host:
+                yield host, line
+
+
+@register_target_splitter("subfinder")
+def split_subfinder(output_dir: str) -> Iterator[Tuple[str, str]]:
+    path = os.path.join(output_dir, "subfinder_scan.json")
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("input") and record.get("host"):
+                yield record["input"], record["host"]
+
+
+def split_by_target(scope_id: str, tool_name: str, output_dir: str):
+    """
+    Splits a batched run's findings per target into handoff/<tool>_by_target.json of its scope.
+    Only runs for scopes created by plan_invocations. Failures are logged, never raised.
+    """
+    splitter = _target_splitters.get(tool_name.lower())
+    targets_path = os.path.join("/app", "outputs", scope_id, "handoff", "targets.json")
+    if not splitter or not os.path.exists(targets_path):
+        return
+    try:
+        with open(targets_path, "r", encoding="utf-8") as f:
+            matcher = TargetMatcher(json.load(f))
+        findings: Dict[str, List[str]] = {}
+        for host, finding in splitter(output_dir):
+            target = matcher.match(host)
+            if target is not None and finding not in findings.setdefault(target, []):
+                findings[target].append(finding)
+        with open(get_handoff_path(scope_id, f"{tool_name.lower()}_by_target.json"), "w", encoding="utf-8") as f:
+            json.dump(findings, f)
+    except Exception:
+        logger.exception(f"Splitting {tool_name} results per target failed")
+
+
+def load_target_findings(scope_id: str, tool_name: str) -> Dict[str, List[str]]:
+    path = os.path.join("/app", "outputs", scope_id, "handoff", f"{tool_name.lower()}_by_target.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -1,24 +1,78 @@
 import subprocess
 import logging
 import shlex
-from typing import List
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from app.models import  ToolOutput
 import os
 from app.post_processing import default_post_processor, get_post_processor
+from app.events import publish_tool_event
+from app.findings import index_findings
+from app.handoff import load_masscan_handoff, run_handoff
+from app.pipeline import PostProcessingPipeline
+from app.rate_governor import governed
+from app.sharding import build_budget_commands, build_shard_commands, merge_shard_outputs
+from app.streaming import StreamedTimeout, run_streaming
+from app.targets import masscan_addresses, split_by_target
+from app.wordlist_ranking import KIND_PATH, KIND_SUBDOMAIN, ranked_wordlist_path, record_hits
+from app.success_rules import OutputClassifier
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ToolSkipped(Exception):
+    """Raised by a command builder when there is nothing for the tool to do in this scan."""
+
+
+def _has_output(output_dir: str, stdout_bytes: int) -> bool:
+    """Whether a stopped run left anything worth keeping: stdout or a non-empty output file."""
+    if stdout_bytes:
+        return True
+    for filename in os.listdir(output_dir):
+        path = os.path.join(output_dir, filename)
+        if filename not in ("output.stdout", "output.stderr") and os.path.isfile(path) and os.path.getsize(path):
+            return True
+    return False
+
+
 class ToolRunner:
     _tool_registry = {}
+    _tool_dependencies = {}
+    _batch_tools = set()
+    _tool_queues = {}
 
     @classmethod
-    def register_tool(cls, tool_name: str):
+    def register_tool(cls, tool_name: str, run_after: Optional[List[str]] = None, batch: bool = False,
+                      queue: str = "celery"):
+        """
+        Registers a command builder for a tool.
+        run_after lists tools that must finish first when they are part of the same scan.
+        batch marks builders that take a `targets` list and scan them all in one invocation.
+        queue is the Celery queue the tool runs on when a scan is fanned out per tool.
+        """
         def decorator(func):
             cls._tool_registry[tool_name] = func
+            cls._tool_dependencies[tool_name] = [name.lower() for name in (run_after or [])]
+            cls._tool_queues[tool_name] = queue
+            if batch:
+                cls._batch_tools.add(tool_name)
             return func
         return decorator
 
+    @classmethod
+    def get_dependencies(cls, tool_name: str) -> List[str]:
+        return cls._tool_dependencies.get(tool_name.lower(), [])
+
+    @classmethod
+    def get_queue(cls, tool_name: str) -> str:
+        return cls._tool_queues.get(tool_name.lower(), "celery")
+
+    @classmethod
+    def get_batch_tools(cls) -> List[str]:
+        return sorted(cls._batch_tools)
+
     @classmethod
     def get_command_builder(cls, tool_name: str):
         builder = cls._tool_registry.get(tool_name)
@@ -27,9 +81,13 @@ class ToolRunner:
         return builder
 
     @staticmethod
-    def execute_command(command: List[str], scan_id: str, tool_name: str, timeout: int = 3600) -> ToolOutput:
+    def execute_command(command: List[str], scan_id: str, tool_name: str, timeout: int = 3600,
+                        post_processing: Optional[PostProcessingPipeline] = None) -> ToolOutput:
         """
-        Safely executes a shell command and captures its output.
+        Safely executes a shell command, streaming its output to disk.
+        Only the last 2000 characters of stdout/stderr are kept in memory.
+        When a post-processing pipeline is given, uploads and cleanup run in the background
+        and artifacts_uploaded is filled in once they finish; otherwise they run inline.
         Uses Windows-compatible paths.
         """
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,13 +101,23 @@ class ToolRunner:
         cwd = "/opt/recon-ng" if tool_name.lower() == "recon-ng" else None
 
         try:
-            logger.info(f"Executing command: {shlex.join(command)} in directory: {cwd or '/app'}")
-            result = subprocess.run(command, capture_output=True, text=True, timeout=timeout, shell=False, check=False, cwd=cwd)
-
-            with open(stdout_file, 'w', encoding='utf-8') as f:
-                f.write(result.stdout)
-            with open(stderr_file, 'w', encoding='utf-8') as f:
-                f.write(result.stderr)
+            classifier = OutputClassifier(tool_name)
+            timed_out = False
+            try:
+                with governed(tool_name, command, timeout) as limited:
+                    logger.info(f"Executing command: {shlex.join(limited)} in directory: {cwd or '/app'}")
+                    result = run_streaming(
+                        limited, stdout_file, stderr_file, timeout=timeout, cwd=cwd,
+                        stdout_listeners=classifier.stdout_listeners,
+                        stderr_listeners=classifier.stderr_listeners
+                    )
+            except StreamedTimeout as e:
+                # Whatever the tool wrote before it was stopped is kept and reported as partial.
+                timed_out = True
+                result = e.result
+                logger.error(f"Command for tool '{tool_name}' timed out after {timeout:.0f} seconds.")
+                with open(stderr_file, 'a') as f:
+                    f.write(f"\nCommand timed out after {timeout:.0f} seconds.\n")
 
             expected_output_file = None
             try:
@@ -61,82 +129,25 @@ class ToolRunner:
             except Exception:
                 pass
 
-            if expected_output_file and not os.path.exists(expected_output_file) and result.stdout:
+            if expected_output_file and not os.path.exists(expected_output_file) and result.stdout_bytes:
                 try:
                     os.makedirs(os.path.dirname(expected_output_file), exist_ok=True)
-                    with open(expected_output_file, 'w', encoding='utf-8') as f:
-                        f.write(result.stdout)
+                    shutil.copyfile(stdout_file, expected_output_file)
                     logger.info(f"Created fallback output file at {expected_output_file}")
                 except Exception as e:
                     logger.error(f"Could not create fallback output file: {e}")
 
-            stderr_lower = (result.stderr or "").lower()
-            stdout_lower = (result.stdout or "").lower()
-            
-            success = False
-            tool_name_lower = tool_name.lower()
-
-            if tool_name_lower in ['recon-ng', 'dirsearch', 'theharvester']:
-                if result.returncode == 0 and 'error' not in (result.stderr or "").lower() and 'traceback' not in (result.stderr or "").lower():
-                    success = True
-            elif tool_name_lower == 'dnsenum':
-                stderr_lower = (result.stderr or "").lower()
-                stdout_lower = (result.stdout or "").lower()
-
-                benign_errors = ["query failed", "noerror", "lame server"]
-
-                has_benign_error = any(err in stderr_lower for err in benign_errors)
-
-                if 'can\'t locate' not in stderr_lower:
-                    if result.returncode == 0:
-                        success = True
-                    elif result.returncode != 0 and has_benign_error:
-                        # Allow partial success if dnsenum gave output but only benign errors
-                        success = True
-
+            if timed_out:
+                success = _has_output(output_dir, result.stdout_bytes)
+                stderr = result.stderr + f"\nCommand timed out after {timeout:.0f} seconds."
             else:
-                stderr_lower = (result.stderr or "").lower()
-                stdout_lower = (result.stdout or "").lower()
-                error_markers = ["invalid module", "invalid option", "invalid command", "error", "traceback", "no such file", "not found", "[!]", "fail", "module not found"]
-                found_error = any(marker in stdout_lower for marker in error_markers) or any(marker in stderr_lower for marker in error_markers)
-                success = (result.returncode == 0) and not found_error
-
-            output_files = [stdout_file, stderr_file]
-            
-            for filename in os.listdir(output_dir):
-                if filename not in ["output.stdout", "output.stderr"]:
-                    full_path = os.path.join(output_dir, filename)
-                    if os.path.isfile(full_path):
-                        output_files.append(full_path)
-
-            
-            if success:
-                logger.info(f"Command for tool '{tool_name}' succeeded. Starting post-processing.")
-                post_processor = get_post_processor(tool_name)
-                post_processor(scan_id, tool_name, output_dir, output_files)
-            else:
-                logger.warning(f"Command for tool '{tool_name}' failed. Uploading raw logs for review.")
-                default_post_processor(scan_id, tool_name, output_dir, output_files)
-            
-            return ToolOutput(
-                tool_name=tool_name,
-                command=command,
-                return_code=result.returncode,
-                stdout=result.stdout[-2000:],
-                stderr=result.stderr[-2000:],
-                output_file_paths=output_files,
-                success=success
+                success = classifier.verdict(result.returncode)
+                stderr = result.stderr
+            return ToolRunner._complete_run(
+                command, scan_id, tool_name, output_dir, result.returncode, success,
+                result.stdout, stderr, post_processing, partial=timed_out and success
             )
 
-        except subprocess.TimeoutExpired:
-            error_msg = f"Command timed out after {timeout} seconds."
-            logger.error(error_msg)
-            with open(stderr_file, 'w') as f:
-                f.write(error_msg)
-            return ToolOutput(
-                tool_name=tool_name, command=command, return_code=-1, stdout="",
-                stderr=error_msg, output_file_paths=[stderr_file], success=False
-            )
         except Exception as e:
             error_msg = f"Failed to execute command: {str(e)}"
             logger.exception(error_msg)
@@ -144,19 +155,195 @@ class ToolRunner:
                 tool_name=tool_name, command=command, return_code=-1, stdout="",
                 stderr=error_msg, output_file_paths=[], success=False
             )
-            
-            
-@ToolRunner.register_tool("nmap")
-def build_nmap_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
+
+
+    @staticmethod
+    def _complete_run(command: List[str], scan_id: str, tool_name: str, output_dir: str, return_code: int,
+                      success: bool, stdout: str, stderr: str,
+                      post_processing: Optional[PostProcessingPipeline], partial: bool = False) -> ToolOutput:
+        """
+        Shared tail of a finished run: hands results off to later tools, builds the ToolOutput
+        and runs (or queues) the post-processor.
+        """
+        if success:
+            run_handoff(scan_id, tool_name, output_dir)
+            record_hits(tool_name, command, output_dir)
+            split_by_target(scan_id, tool_name, output_dir)
+
+        output_files = [os.path.join(output_dir, "output.stdout"), os.path.join(output_dir, "output.stderr")]
+
+        for filename in os.listdir(output_dir):
+            if filename not in ["output.stdout", "output.stderr"]:
+                full_path = os.path.join(output_dir, filename)
+                if os.path.isfile(full_path):
+                    output_files.append(full_path)
+
+        tool_output = ToolOutput(
+            tool_name=tool_name,
+            command=command,
+            return_code=return_code,
+            stdout=stdout,
+            stderr=stderr,
+            output_file_paths=output_files,
+            success=success,
+            partial=partial
+        )
+
+        if success:
+            logger.info(f"Command for tool '{tool_name}' succeeded. Starting post-processing.")
+            post_processor = get_post_processor(tool_name)
+        else:
+            logger.warning(f"Command for tool '{tool_name}' failed. Uploading raw logs for review.")
+            post_processor = default_post_processor
+
+        def post_process() -> bool:
+            if success:
+                index_findings(scan_id, tool_name, command, output_dir)
+            return post_processor(scan_id, tool_name, output_dir, output_files)
+
+        def record_upload(succeeded: bool):
+            tool_output.artifacts_uploaded = succeeded
+            publish_tool_event(scan_id, tool_output)
+
+        if post_processing is not None:
+            post_processing.submit(tool_name, post_process, on_done=record_upload, key=(scan_id, tool_name.lower()))
+        else:
+            record_upload(bool(post_process()))
+
+        return tool_output
+
+    @staticmethod
+    def _run_segment(command: List[str], segment_dir: str, tool_name: str, label: str,
+                     timeout: float) -> Optional[bool]:
+        """Runs one piece of a split run inside its own directory. Returns None if it timed out."""
+        classifier = OutputClassifier(tool_name)
+        try:
+            with governed(tool_name, command, timeout) as limited:
+                logger.info(f"Executing {label}: {shlex.join(limited)}")
+                result = run_streaming(
+                    limited, os.path.join(segment_dir, "output.stdout"),
+                    os.path.join(segment_dir, "output.stderr"), timeout=timeout,
+                    stdout_listeners=classifier.stdout_listeners,
+                    stderr_listeners=classifier.stderr_listeners
+                )
+            return classifier.verdict(result.returncode)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{label} stopped after {timeout:.0f} seconds.")
+            return None
+        except Exception as e:
+            logger.error(f"{label} failed: {e}")
+            return False
+
+    @staticmethod
+    def execute_sharded(command: List[str], scan_id: str, tool_name: str, shards: int, timeout: int = 3600,
+                        post_processing: Optional[PostProcessingPipeline] = None) -> ToolOutput:
+        """
+        Runs a content-discovery command as `shards` concurrent processes, each on a slice of the wordlist.
+        - The request-rate budget (RECON_BRUTEFORCE_MAX_RPS or dirsearch --max-rate) is split across shards.
+        - Shard outputs are merged and deduplicated into the usual output file, stdout and stderr,
+          so the post-processors see the same files as for a single run.
+        - If only some shards fail, the run is a partial success.
+        """
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output_dir = os.path.join(project_root, "outputs", scan_id, tool_name)
+        shards_dir = os.path.join(output_dir, "shards")
+        os.makedirs(shards_dir, exist_ok=True)
+
+        try:
+            shard_commands = build_shard_commands(command, tool_name, shards, shards_dir)
+        except Exception as e:
+            logger.warning(f"Cannot shard {tool_name} ({e}); running it as a single process.")
+            shutil.rmtree(shards_dir, ignore_errors=True)
+            return ToolRunner.execute_command(command, scan_id, tool_name, timeout, post_processing)
+
+        def run_shard(index: int) -> Optional[bool]:
+            label = f"shard {index + 1}/{shards} of {tool_name}"
+            return ToolRunner._run_segment(shard_commands[index], os.path.join(shards_dir, str(index)),
+                                           tool_name, label, timeout)
+
+        with ThreadPoolExecutor(max_workers=shards, thread_name_prefix=f"{tool_name}-shard") as executor:
+            shard_success = list(executor.map(run_shard, range(shards)))
+
+        stdout_tail, stderr_tail = merge_shard_outputs(command, shards, shards_dir, output_dir)
+        shutil.rmtree(shards_dir, ignore_errors=True)
+
+        # Shards stopped by the timeout still contributed what they found so far.
+        succeeded = shard_success.count(True)
+        usable = succeeded + shard_success.count(None)
+        partial = 0 < usable and succeeded < shards
+        if partial:
+            logger.warning(f"{tool_name}: {shards - succeeded} of {shards} shards failed or timed out, "
+                           f"reporting partial results.")
+        return ToolRunner._complete_run(
+            command, scan_id, tool_name, output_dir, 0 if succeeded == shards else 1, usable > 0,
+            stdout_tail, stderr_tail, post_processing, partial=partial
+        )
+
+
+    @staticmethod
+    def execute_budgeted(command: List[str], scan_id: str, tool_name: str, time_budget: float,
+                         timeout: int = 3600, post_processing: Optional[PostProcessingPipeline] = None) -> ToolOutput:
+        """
+        Runs a brute force over a ranked wordlist within a time budget.
+        - The head (words that hit in earlier scans) always runs to completion, under the normal timeout.
+        - The rest of the list only runs for whatever is left of the budget; stopping there is not a failure.
+        - Outputs of both parts are merged into the usual files.
+        """
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output_dir = os.path.join(project_root, "outputs", scan_id, tool_name)
+        segments_dir = os.path.join(output_dir, "segments")
+        os.makedirs(segments_dir, exist_ok=True)
+
+        try:
+            head_size, (head_cmd, tail_cmd) = build_budget_commands(command, segments_dir)
+        except Exception as e:
+            logger.warning(f"Cannot apply a time budget to {tool_name} ({e}); running it without one.")
+            shutil.rmtree(segments_dir, ignore_errors=True)
+            return ToolRunner.execute_command(command, scan_id, tool_name, timeout, post_processing)
+
+        started = time.monotonic()
+        head_success = True
+        if head_size:
+            head_success = ToolRunner._run_segment(head_cmd, os.path.join(segments_dir, "0"), tool_name,
+                                                   f"ranked head ({head_size} words) of {tool_name}", timeout)
+        remaining = min(timeout - (time.monotonic() - started), time_budget - (time.monotonic() - started))
+        tail_success = None
+        if head_success is True and remaining > 0:
+            tail_success = ToolRunner._run_segment(tail_cmd, os.path.join(segments_dir, "1"), tool_name,
+                                                   f"rest of the wordlist of {tool_name}", remaining)
+        if tail_success is None:
+            logger.info(f"{tool_name}: time budget of {time_budget:.0f}s used up after the ranked head.")
+
+        stdout_tail, stderr_tail = merge_shard_outputs(command, 2, segments_dir, output_dir)
+        shutil.rmtree(segments_dir, ignore_errors=True)
+
+        # The tail is meant to stop at the budget; a head cut short by the timeout is a partial result.
+        success = head_success is not False and tail_success is not False
+        return ToolRunner._complete_run(
+            command, scan_id, tool_name, output_dir, 0 if success else 1, success,
+            stdout_tail, stderr_tail, post_processing, partial=head_success is None
+        )
+
+
+@ToolRunner.register_tool("nmap", run_after=["masscan"], batch=True, queue="raw_socket")
+def build_nmap_command(target: str, parameters: List, scan_id: str, tool_name: str,
+                       targets: Optional[List[str]] = None) -> List[str]:
     """
     Builds nmap command with proper parameter handling for Windows.
     Handles both ToolParameter objects and dictionaries.
+    If masscan ran earlier in the same scan, only the hosts and ports it found open are scanned.
+    A batch of targets is passed with -iL.
     """    
     cmd = ["nmap"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
     os.makedirs(output_dir, exist_ok=True)
     output_base = os.path.join(output_dir, "nmap_scan")
     output_specified = False
+
+    masscan_ports = load_masscan_handoff(scan_id)
+    if masscan_ports is not None and not masscan_ports:
+        raise ToolSkipped("masscan found no open ports, nothing for nmap to scan.")
+    port_selection_flags = ('-p', '--top-ports', '-F', '-iL')
         
     for param in parameters:
         if hasattr(param, 'flag'):
@@ -168,6 +355,7 @@ def build_nmap_command(target: str, parameters: List, scan_id: str, tool_name: s
             value = param.get('value')
             requires_value = param.get('requiresValue', False)
         if not flag or flag == "<target>": continue            
+        if masscan_ports and flag in port_selection_flags: continue
         if flag in ('-oX', '-oN', '-oA'):
             output_specified = True
             cmd.extend([flag, output_base])
@@ -178,16 +366,43 @@ def build_nmap_command(target: str, parameters: List, scan_id: str, tool_name: s
             
     if not output_specified:
         cmd.extend(["-oX", f"{output_base}.xml"])
-    
-    cmd.append(target)
+
+    if masscan_ports:
+        # nmap takes one port list per run, so scan the union of ports across the hosts masscan found.
+        tcp_ports = sorted({port for protocols in masscan_ports.values() for port in protocols.get("tcp", [])})
+        udp_ports = sorted({port for protocols in masscan_ports.values() for port in protocols.get("udp", [])})
+        port_spec = ",".join(str(port) for port in tcp_ports)
+        if udp_ports:
+            port_spec = ",".join(filter(None, [
+                f"T:{port_spec}" if port_spec else "",
+                "U:" + ",".join(str(port) for port in udp_ports)
+            ]))
+            if "-sU" not in cmd:
+                cmd.append("-sU")
+            if tcp_ports and "-sS" not in cmd and "-sT" not in cmd:
+                cmd.append("-sS")
+        hosts_file = os.path.join(output_dir, "masscan_hosts.txt")
+        with open(hosts_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(masscan_ports) + "\n")
+        cmd.extend(["-p", port_spec, "-iL", hosts_file])
+        logger.info(f"Using masscan handoff: {len(masscan_ports)} hosts, ports {port_spec}")
+    elif targets:
+        targets_file = os.path.join(output_dir, "targets.txt")
+        with open(targets_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(targets) + "\n")
+        cmd.extend(["-iL", targets_file])
+    else:
+        cmd.append(target)
     
     logger.info(f"Built nmap command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("masscan")
-def build_masscan_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
+@ToolRunner.register_tool("masscan", batch=True, queue="raw_socket")
+def build_masscan_command(target: str, parameters: List, scan_id: str, tool_name: str,
+                          targets: Optional[List[str]] = None) -> List[str]:
     """
     Builds masscan command with proper parameter handling.
+    Targets are passed as one comma separated list of addresses and ranges.
     """
     cmd = ["masscan"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
@@ -209,21 +424,22 @@ def build_masscan_command(target: str, parameters: List, scan_id: str, tool_name
         cmd.extend(["-p", "1-1000"])
         
     cmd.extend(["-oJ", output_base])
+    if targets:
+        target = ",".join(masscan_addresses(targets))
     print("Target in masscan: ", target)
     cmd.append(target)
     logger.info(f"Built masscan command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("amass")
+@ToolRunner.register_tool("amass", queue="osint")
 def build_amass_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     """
     Builds amass command with proper parameter handling.
-    -rf flag is a boolean that points to a hardcoded wordlist.
+    -rf flag is a boolean that points to the bundled wordlist, ranked by hits from past scans.
     Ignores deprecated flags like -src and -ip.
     """
     cmd = ["amass", "enum", "-d", target]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
-    wordlists_dir = "/app/wordlists"
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "amass_scan.txt")
 
@@ -238,7 +454,7 @@ def build_amass_command(target: str, parameters: List, scan_id: str, tool_name:
             continue
 
         if flag == "-rf" and value in (True, "true"):
-            cmd.extend(["-rf", os.path.join(wordlists_dir, "subdomains-top1million-5000.txt")])
+            cmd.extend(["-rf", ranked_wordlist_path("subdomains-top1million-5000.txt", KIND_SUBDOMAIN)])
         elif flag not in ["-d", "enum"]:
             if value is not None and value not in (True, "true"): cmd.extend([flag, str(value)])
             elif value in (True, "true"): cmd.append(flag)
@@ -248,11 +464,13 @@ def build_amass_command(target: str, parameters: List, scan_id: str, tool_name:
     logger.info(f"Built amass command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("subfinder")
-def build_subfinder_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
+@ToolRunner.register_tool("subfinder", batch=True, queue="osint")
+def build_subfinder_command(target: str, parameters: List, scan_id: str, tool_name: str,
+                            targets: Optional[List[str]] = None) -> List[str]:
     """
     Builds subfinder command with proper parameter handling.
     -dL flag is a boolean that points to a hardcoded domain list.
+    A batch of targets is written to a domain list and passed with -dL.
     """
     cmd = ["subfinder", "-silent"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
@@ -272,7 +490,12 @@ def build_subfinder_command(target: str, parameters: List, scan_id: str, tool_na
             domain_flag_used = True
             break
 
-    if not domain_flag_used:
+    if not domain_flag_used and targets:
+        domains_file = os.path.join(output_dir, "domains.txt")
+        with open(domains_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(targets) + "\n")
+        cmd.extend(["-dL", domains_file])
+    elif not domain_flag_used:
         cmd.extend(["-d", target])
 
     for param in parameters:
@@ -292,7 +515,7 @@ def build_subfinder_command(target: str, parameters: List, scan_id: str, tool_na
     logger.info(f"Built subfinder command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("theharvester")
+@ToolRunner.register_tool("theharvester", queue="osint")
 def build_theharvester_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     """
     Builds theHarvester command with proper parameter handling.
@@ -316,7 +539,7 @@ def build_theharvester_command(target: str, parameters: List, scan_id: str, tool
     logger.info(f"Built theHarvester command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("recon-ng")
+@ToolRunner.register_tool("recon-ng", queue="osint")
 def build_recon_ng_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     """
     Builds a recon-ng command by dynamically creating a resource script.
@@ -356,11 +579,10 @@ def build_recon_ng_command(target: str, parameters: List, scan_id: str, tool_nam
     logger.info(f"Built recon-ng command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("gobuster")
+@ToolRunner.register_tool("gobuster", queue="http")
 def build_gobuster_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     cmd = ["gobuster"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
-    wordlists_dir = "/app/wordlists"
     os.makedirs(output_dir, exist_ok=True)
     output_base = os.path.join(output_dir, "gobuster_scan")
 
@@ -377,7 +599,7 @@ def build_gobuster_command(target: str, parameters: List, scan_id: str, tool_nam
 
         if flag == "-w":
             if value in (True, "true"):
-                cmd.extend([flag, os.path.join(wordlists_dir, "common.txt")])
+                cmd.extend([flag, ranked_wordlist_path("common.txt", KIND_PATH if mode == "dir" else KIND_SUBDOMAIN)])
             continue
             
         if flag == "-o":
@@ -412,7 +634,7 @@ def build_gobuster_command(target: str, parameters: List, scan_id: str, tool_nam
             cmd.extend(['-d', target])
 
     if mode in ["dir", "vhost"] and "-w" not in cmd:
-        cmd.extend(["-w", os.path.join(wordlists_dir, "common.txt")])
+        cmd.extend(["-w", ranked_wordlist_path("common.txt", KIND_PATH if mode == "dir" else KIND_SUBDOMAIN)])
             
     if "-o" not in cmd:
         cmd.extend(["-o", f"{output_base}.txt"])
@@ -420,11 +642,10 @@ def build_gobuster_command(target: str, parameters: List, scan_id: str, tool_nam
     logger.info(f"Built gobuster command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("dirsearch")
+@ToolRunner.register_tool("dirsearch", queue="http")
 def build_dirsearch_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     cmd = ["dirsearch"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
-    wordlists_dir = "/app/wordlists"
     os.makedirs(output_dir, exist_ok=True)
     output_base = os.path.join(output_dir, "dirsearch_scan")
     target_flag_set = False
@@ -438,7 +659,7 @@ def build_dirsearch_command(target: str, parameters: List, scan_id: str, tool_na
 
         if flag == "-w":
             if value in (True, "true"):
-                cmd.extend([flag, os.path.join(wordlists_dir, "directory-list-2.3-small.txt")])
+                cmd.extend([flag, ranked_wordlist_path("directory-list-2.3-small.txt", KIND_PATH)])
             continue
             
         if flag == "-o":
@@ -465,7 +686,7 @@ def build_dirsearch_command(target: str, parameters: List, scan_id: str, tool_na
         cmd.extend(['-u', url])
 
     if "-w" not in cmd:
-        cmd.extend(["-w", os.path.join(wordlists_dir, "directory-list-2.3-small.txt")])
+        cmd.extend(["-w", ranked_wordlist_path("directory-list-2.3-small.txt", KIND_PATH)])
             
     if "-o" not in cmd:
         cmd.extend(["-o", f"{output_base}.txt"])
@@ -473,8 +694,9 @@ def build_dirsearch_command(target: str, parameters: List, scan_id: str, tool_na
     logger.info(f"Built dirsearch command: {cmd}")
     return cmd
 
-@ToolRunner.register_tool("whatweb")
-def build_whatweb_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
+@ToolRunner.register_tool("whatweb", batch=True, queue="http")
+def build_whatweb_command(target: str, parameters: List, scan_id: str, tool_name: str,
+                          targets: Optional[List[str]] = None) -> List[str]:
     cmd = ["whatweb"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
     os.makedirs(output_dir, exist_ok=True)
@@ -501,25 +723,28 @@ def build_whatweb_command(target: str, parameters: List, scan_id: str, tool_name
     if not output_specified:
         cmd.extend(["--log-brief", f"{output_base}.txt"])
 
-    url = target
-    if not url.startswith(('http://', 'https://')):
-        url = f"http://{url}"
-    cmd.append(url)
+    urls = [t if t.startswith(('http://', 'https://')) else f"http://{t}" for t in targets or [target]]
+    if len(urls) > 1:
+        urls_file = os.path.join(output_dir, "urls.txt")
+        with open(urls_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(urls) + "\n")
+        cmd.extend(["--input-file", urls_file])
+    else:
+        cmd.append(urls[0])
 
     logger.info(f"Built whatweb command: {cmd}")
     return cmd
 
 
-@ToolRunner.register_tool("dnsenum")
+@ToolRunner.register_tool("dnsenum", queue="osint")
 def build_dnsenum_command(target: str, parameters: List, scan_id: str, tool_name: str) -> List[str]:
     """
     Builds dnsenum command with proper parameter handling.
-    --file is a boolean that points to a hardcoded wordlist.
+    --file is a boolean that points to the bundled wordlist, ranked by hits from past scans.
     Domain is always the main target.
     """
     cmd = ["dnsenum"]
     output_dir = f"/app/outputs/{scan_id}/{tool_name}"
-    wordlists_dir = "/app/wordlists"
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "dnsenum_scan.xml")
 
@@ -534,7 +759,7 @@ def build_dnsenum_command(target: str, parameters: List, scan_id: str, tool_name
         
         # Check for the logical '--file' flag from the frontend
         if flag == "--file" and value in (True, "true", "True"):
-            cmd.extend(["-f", os.path.join(wordlists_dir, "subdomains-top1million-5000.txt")])
+            cmd.extend(["-f", ranked_wordlist_path("subdomains-top1million-5000.txt", KIND_SUBDOMAIN)])
         elif flag not in ["-o", "--file", "<domain>"]:
             if value is not None and value not in (True, "true", "True"):
                 cmd.extend([flag, str(value)])
@@ -1,28 +1,160 @@
+import os
+import time
 import socket
-from typing import Optional
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.dns_resolver import resolve_hosts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DNS_CACHE_SIZE = 4096
+DEFAULT_DNS_TTL = 300
+DEFAULT_NEGATIVE_TTL = 60
+MAX_DNS_TTL = 3600
+
+
+class DnsCache:
+    """
+    Process-wide, thread-safe DNS cache.
+    - Entries expire after the record TTL (capped at MAX_DNS_TTL).
+    - Failed lookups are cached too, for the shorter negative TTL.
+    - The least recently used entry is evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_DNS_CACHE_SIZE, negative_ttl: int = DEFAULT_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: Tuple[str, str], value: Any, ttl: Optional[int]):
+        if not value:
+            ttl = self.negative_ttl
+        ttl = min(ttl if ttl is not None else DEFAULT_DNS_TTL, MAX_DNS_TTL)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries)}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+_dns_cache: Optional[DnsCache] = None
+_dns_cache_lock = threading.Lock()
+
+
+def get_dns_cache() -> DnsCache:
+    """The process-wide DNS cache, sized from RECON_DNS_CACHE_SIZE and RECON_DNS_NEGATIVE_TTL on first use."""
+    global _dns_cache
+    with _dns_cache_lock:
+        if _dns_cache is None:
+            _dns_cache = DnsCache(
+                max_entries=_env_int("RECON_DNS_CACHE_SIZE", DEFAULT_DNS_CACHE_SIZE),
+                negative_ttl=_env_int("RECON_DNS_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL),
+            )
+        return _dns_cache
+
+
+def get_dns_cache_stats() -> Dict[str, int]:
+    """Returns the hit/miss counters of the process-wide DNS cache."""
+    return get_dns_cache().stats()
+
+
+def is_ip_address(value: str) -> bool:
+    """True for IPv4 and IPv6 literals (brackets allowed around IPv6)."""
+    try:
+        ipaddress.ip_address(value.strip().strip("[]"))
+        return True
+    except ValueError:
+        return False
+
 
 def reverse_dns_lookup(ip_address: str) -> Optional[str]:
     """
     Performs a reverse DNS lookup on an IP address.
     Returns the first associated domain name, or None if not found.
     """
+    key = ("ptr", ip_address)
+    hit, domain = get_dns_cache().get(key)
+    if hit:
+        return domain or None
     try:
         # getfqdn returns the first fully qualified domain name from the reverse lookup
         domain = socket.getfqdn(ip_address)
         # If the result is the same as the input, no PTR record was found
-        return domain if domain != ip_address else None
+        domain = domain if domain != ip_address else None
     except (socket.herror, socket.gaierror, OSError):
         # Handle errors (no reverse, invalid IP, etc.)
-        return None
-    
-def resolve_to_ip(hostname: str) -> str:
-    """Resolves a hostname to an IP address."""
+        domain = None
+    get_dns_cache().set(key, domain or "", None)
+    return domain
+
+
+def _lookup_addresses(hostname: str) -> Tuple[List[str], Optional[int]]:
+    """Queries DNS directly to learn the record TTL, falling back to the system resolver (/etc/hosts etc.)."""
     try:
-        # Check if it's already an IP
-        socket.inet_aton(hostname)
-        return hostname
-    except socket.error:
-        try:
-            return socket.gethostbyname(hostname)
-        except socket.gaierror:
-            return hostname
+        host = resolve_hosts([hostname], retries=1).get(hostname.lower().rstrip("."))
+        if host and (host.a or host.aaaa):
+            return host.a + host.aaaa, host.ttl
+    except Exception as e:
+        logger.debug(f"Direct DNS lookup for {hostname} failed: {e}")
+    try:
+        infos = socket.getaddrinfo(hostname, None, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, OSError):
+        return [], None
+    return list(dict.fromkeys(info[4][0] for info in infos)), None
+
+
+def resolve_all(hostname: str) -> List[str]:
+    """Resolves a hostname to all of its IPv4 and IPv6 addresses (IPv4 first), using the DNS cache."""
+    if is_ip_address(hostname):
+        return [str(ipaddress.ip_address(hostname.strip().strip("[]")))]
+    key = ("addr", hostname.lower())
+    hit, addresses = get_dns_cache().get(key)
+    if hit:
+        return list(addresses)
+    addresses, ttl = _lookup_addresses(hostname)
+    addresses = sorted(addresses, key=lambda a: ipaddress.ip_address(a).version)
+    get_dns_cache().set(key, tuple(addresses), ttl)
+    return addresses
+
+
+def resolve_to_ip(hostname: str) -> str:
+    """Resolves a hostname to an IP address, preferring IPv4. Returns the input if it cannot be resolved."""
+    addresses = resolve_all(hostname)
+    return addresses[0] if addresses else hostname
@@ -0,0 +1,328 @@
+import os
+import glob
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.commands import option_value
+from app.wordlists import WORDLISTS_DIR, get_cache_dir, get_wordlist
+from app.subdomains import normalize_hostname, scan_hostnames
+
+logger = logging.getLogger(__name__)
+
+KIND_PATH = "path"
+KIND_SUBDOMAIN = "subdomain"
+
+DEFAULT_HITS_DB = "/app/outputs/wordlist_hits.sqlite3"
+# A ranked list is rebuilt once this many runs were recorded since it was written.
+DEFAULT_REBUILD_EVERY = 10
+# Older ranked lists are kept this long, in case a running command still reads them.
+STALE_RANKED_SECONDS = 3600
+
+_hit_extractors: Dict[str, Callable] = {}
+
+
+def ranking_enabled() -> bool:
+    """Opt-in per deployment (RECON_RANKED_WORDLISTS): ranking changes the lists, and so the output, of scans."""
+    return os.getenv("RECON_RANKED_WORDLISTS", "false").lower() in ("1", "true", "yes")
+
+
+def get_hits_db_path() -> str:
+    """The hit store (RECON_WORDLIST_HITS_DB), on the persistent outputs volume so every scan pod learns from it."""
+    return os.getenv("RECON_WORDLIST_HITS_DB", DEFAULT_HITS_DB)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        logger.warning(f"Invalid {name} value, using default.")
+        return default
+
+
+class HitCounter:
+    """
+    Counts, per kind of wordlist (paths or subdomain labels), in how many runs each word produced a hit.
+    - One row per (kind, word) in a local SQLite file, so the store stays small and survives restarts.
+    - Every recorded run bumps the kind's revision, which keys the cached ranked lists.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hits (kind TEXT NOT NULL, word TEXT NOT NULL, count INTEGER NOT NULL, "
+                "last_seen REAL NOT NULL, PRIMARY KEY (kind, word)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS revisions (kind TEXT PRIMARY KEY, revision INTEGER NOT NULL)")
+            self._initialized = True
+        return conn
+
+    def record(self, kind: str, words: Iterable[str]) -> int:
+        """Counts one hit for each distinct word of a run; returns the number of words recorded."""
+        unique = {w for w in words if w}
+        if not unique:
+            return 0
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO hits (kind, word, count, last_seen) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (kind, word) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen",
+                ((kind, word, now) for word in unique)
+            )
+            conn.execute(
+                "INSERT INTO revisions (kind, revision) VALUES (?, 1) "
+                "ON CONFLICT (kind) DO UPDATE SET revision = revision + 1", (kind,)
+            )
+        return len(unique)
+
+    def counts(self, kind: str) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT word, count FROM hits WHERE kind = ?", (kind,)))
+
+    def revision(self, kind: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT revision FROM revisions WHERE kind = ?", (kind,)).fetchone()
+        return row[0] if row else 0
+
+
+_counter: Optional[HitCounter] = None
+_counter_lock = threading.Lock()
+
+
+def get_hit_counter() -> HitCounter:
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = HitCounter(get_hits_db_path())
+        return _counter
+
+
+# --- Recording hits from completed runs ---
+
+def register_hit_extractor(tool_name: str) -> Callable:
+    """
+    A decorator to register the function that lists the wordlist entries a finished run hit.
+    Extractors take (command, output_dir) and return (kind, words).
+    """
+    def decorator(func: Callable) -> Callable:
+        _hit_extractors[tool_name.lower()] = func
+        return func
+    return decorator
+
+
+def _read_lines(path: Optional[str]) -> Iterator[str]:
+    if not path or not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def _labels(names: Iterable[str], domain: Optional[str]) -> Iterator[str]:
+    """The labels in front of the target domain, e.g. 'api' and 'dev' for api.dev.example.com."""
+    domain = normalize_hostname(domain) if domain else None
+    for name in names:
+        name = normalize_hostname(name)
+        if not name or not domain or not name.endswith("." + domain):
+            continue
+        yield from name[:-len(domain) - 1].split(".")
+
+
+def _relative_path(url: str, base_url: str) -> str:
+    path = urlparse(url).path
+    base_path = urlparse(base_url).path.rstrip("/")
+    if base_path and path.startswith(base_path + "/"):
+        path = path[len(base_path):]
+    return path.strip("/")
+
+
+@register_hit_extractor("gobuster")
+def gobuster_hits(command: List[str], output_dir: str) -> Tuple[str, Iterable[str]]:
+    mode = command[1] if len(command) > 1 else None
+    lines = _read_lines(option_value(command, "-o"))
+    if mode == "dir":
+        # "/admin                (Status: 301) [Size: 178] [--> http://target/admin/]"
+        return KIND_PATH, (line.split()[0].strip("/") for line in lines if "(Status:" in line)
+    if mode in ("dns", "vhost"):
+        domain = option_value(command, "-d") or urlparse(option_value(command, "-u") or "").hostname
+        names = (line.split()[1] for line in lines if line.startswith("Found:") and len(line.split()) > 1)
+        return KIND_SUBDOMAIN, _labels(names, domain)
+    return KIND_PATH, []
+
+
+@register_hit_extractor("dirsearch")
+def dirsearch_hits(command: List[str], output_dir: str) -> Tuple[str, Iterable[str]]:
+    # "200     2KB  http://target/admin/"
+    base_url = option_value(command, "-u") or ""
+    urls = (next((part for part in line.split() if part.startswith(("http://", "https://"))), None)
+            for line in _read_lines(option_value(command, "-o")))
+    return KIND_PATH, (_relative_path(url, base_url) for url in urls if url)
+
+
+@register_hit_extractor("dnsenum")
+def dnsenum_hits(command: List[str], output_dir: str) -> Tuple[str, Iterable[str]]:
+    output_file = option_value(command, "-o")
+    names = scan_hostnames(output_file) if output_file and os.path.exists(output_file) else []
+    return KIND_SUBDOMAIN, _labels(names, command[-1])
+
+
+@register_hit_extractor("amass")
+def amass_hits(command: List[str], output_dir: str) -> Tuple[str, Iterable[str]]:
+    output_file = option_value(command, "-o")
+    names = scan_hostnames(output_file) if output_file and os.path.exists(output_file) else []
+    return KIND_SUBDOMAIN, _labels(names, option_value(command, "-d"))
+
+
+def record_hits(tool_name: str, command: List[str], output_dir: str):
+    """Records the wordlist hits of a successful run. Failures are logged, never raised."""
+    extractor = _hit_extractors.get(tool_name.lower())
+    if not extractor or not ranking_enabled():
+        return
+    try:
+        kind, words = extractor(command, output_dir)
+        recorded = get_hit_counter().record(kind, words)
+        logger.info(f"Recorded {recorded} {kind} hits from {tool_name}")
+    except Exception:
+        logger.exception(f"Recording wordlist hits for {tool_name} failed")
+
+
+# --- Ranked wordlists ---
+
+class RankedWordlist(NamedTuple):
+    path: str
+    head_size: int
+
+
+def _write_ranked(name: str, kind: str, path: str) -> int:
+    """Writes words that hit before (most runs first, ties in list order) followed by the rest in list order."""
+    handle = get_wordlist(name)
+    counts = get_hit_counter().counts(kind)
+    head = []
+    for index, word in enumerate(handle.iter_words()):
+        count = counts.get(word.decode("utf-8", errors="replace"))
+        if count:
+            head.append((-count, index, word))
+    head.sort()
+    head_indices = {index for _, index, _ in head}
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as out:
+        for _, _, word in head:
+            out.write(word + b"\n")
+        for index, word in enumerate(handle.iter_words()):
+            if index not in head_indices:
+                out.write(word + b"\n")
+    with open(f"{path}.json", "w") as f:
+        json.dump({"source": name, "kind": kind, "version": handle.version, "head_size": len(head)}, f)
+    os.replace(tmp_path, path)
+    return len(head)
+
+
+def _ranked_revisions(prefix: str) -> Dict[int, str]:
+    """The ranked lists already written for a list and kind, by hit revision."""
+    revisions = {}
+    for path in glob.glob(f"{prefix}-r*.txt"):
+        try:
+            revisions[int(path[len(prefix) + 2:-len(".txt")])] = path
+        except ValueError:
+            continue
+    return revisions
+
+
+def _remove_stale_ranked(revisions: Dict[int, str], keep: int):
+    """Removes ranked lists older than the newest `keep`, once nothing should still be reading them."""
+    cutoff = time.time() - STALE_RANKED_SECONDS
+    for revision in sorted(revisions)[:-keep]:
+        path = revisions[revision]
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                os.remove(f"{path}.json")
+        except OSError:
+            pass
+
+
+def get_ranked_wordlist(name: str, kind: str) -> RankedWordlist:
+    """
+    Returns a copy of a bundled wordlist reordered by past hits, cached per list version and hit revision.
+    - The newest ranked list is reused until RECON_RANKING_REBUILD_EVERY more runs were recorded.
+    - The previous lists stay on disk for STALE_RANKED_SECONDS, as commands built earlier may still read them.
+    Without recorded hits (or with RECON_RANKED_WORDLISTS off) this is the plain list with an empty head.
+    """
+    handle = get_wordlist(name)
+    revision = get_hit_counter().revision(kind) if ranking_enabled() else 0
+    if not revision:
+        return RankedWordlist(handle.path, 0)
+
+    prefix = os.path.join(get_cache_dir(), f"{name}.{handle.version[:16]}.ranked-{kind}")
+    revisions = _ranked_revisions(prefix)
+    latest = max((r for r in revisions if r <= revision and ranked_head_size(revisions[r]) is not None), default=None)
+    if latest is not None and revision - latest < _env_int("RECON_RANKING_REBUILD_EVERY", DEFAULT_REBUILD_EVERY):
+        return RankedWordlist(revisions[latest], ranked_head_size(revisions[latest]))
+
+    path = f"{prefix}-r{revision}.txt"
+    head_size = _write_ranked(name, kind, path)
+    logger.info(f"Ranked {name} by {kind} hits: {head_size} words have hit before")
+    revisions[revision] = path
+    _remove_stale_ranked(revisions, keep=3)
+    return RankedWordlist(path, head_size)
+
+
+def ranked_wordlist_path(name: str, kind: str) -> str:
+    """
+    Builder helper: the ranked list if there is one, otherwise the bundled list.
+    With ranking off this is the bundled file itself, untouched, and no hit store is read.
+    """
+    if not ranking_enabled():
+        return os.path.join(WORDLISTS_DIR, name)
+    try:
+        return get_ranked_wordlist(name, kind).path
+    except Exception:
+        logger.exception(f"Could not rank wordlist {name}, using it as is")
+        return get_wordlist(name).path
+
+
+def ranked_head_size(path: str) -> Optional[int]:
+    """The number of previously-hit words at the top of a ranked list, or None if it is not one."""
+    try:
+        with open(f"{path}.json", "r") as f:
+            return int(json.load(f)["head_size"]) if os.path.exists(path) else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def pop_time_budget(parameters: List) -> Tuple[Optional[float], List]:
+    """
+    Reads the logical '--time-budget' parameter in seconds (falling back to RECON_BRUTEFORCE_TIME_BUDGET)
+    and returns it with the remaining parameters.
+    """
+    budget = os.getenv("RECON_BRUTEFORCE_TIME_BUDGET")
+    remaining = []
+    for param in parameters:
+        flag = param.flag if hasattr(param, 'flag') else param.get('flag')
+        if flag == "--time-budget":
+            budget = param.value if hasattr(param, 'value') else param.get('value')
+            continue
+        remaining.append(param)
+    try:
+        budget = float(budget) if budget else None
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring invalid time budget: {budget}")
+        budget = None
+    return (budget if budget and budget > 0 else None), remaining
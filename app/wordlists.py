@@ -0,0 +1,239 @@
+import os
+import json
+import mmap
+import hashlib
+import logging
+import tempfile
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WORDLISTS_DIR = "/app/wordlists"
+DEFAULT_CACHE_DIR = "/tmp/horuseye/wordlists"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def get_cache_dir() -> str:
+    cache_dir = os.getenv("RECON_WORDLIST_CACHE", DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _source_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clean_words(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Strips whitespace, comments and blank lines, and drops duplicates while keeping the original order."""
+    seen = set()
+    for line in lines:
+        word = line.strip()
+        if not word or word.startswith(b"#") or word in seen:
+            continue
+        seen.add(word)
+        yield word
+
+
+class WordlistHandle:
+    """
+    A preprocessed wordlist: a cleaned words file plus an offsets index, both memory-mapped.
+    - path: the cleaned, deduplicated list, usable directly as a tool argument.
+    - version: content digest of the source list, for cache keys.
+    - shard()/subset() write derived lists as temp files; fifo() streams a shard through a named pipe.
+    """
+
+    def __init__(self, name: str, path: str, index_path: str, version: str):
+        self.name = name
+        self.path = path
+        self.index_path = index_path
+        self.version = version
+        self._open_lock = threading.Lock()
+        self._words = None
+        self._offsets = None
+
+    def _mapped(self):
+        with self._open_lock:
+            if self._words is None:
+                with open(self.path, "rb") as f:
+                    self._words = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.path) else b""
+                with open(self.index_path, "rb") as f:
+                    offsets = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._offsets = memoryview(offsets).cast("Q")
+        return self._words, self._offsets
+
+    def __len__(self) -> int:
+        return len(self._mapped()[1]) - 1
+
+    def word(self, index: int) -> str:
+        words, offsets = self._mapped()
+        return words[offsets[index]:offsets[index + 1] - 1].decode("utf-8", errors="replace")
+
+    def iter_words(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[bytes]:
+        words, offsets = self._mapped()
+        for index in range(start, len(self) if stop is None else stop, step):
+            yield words[offsets[index]:offsets[index + 1] - 1]
+
+    def _shard_bounds(self, index: int, total: int) -> range:
+        if not 0 <= index < total:
+            raise ValueError(f"Shard index {index} out of range for {total} shards")
+        count = len(self)
+        return range(index * count // total, (index + 1) * count // total)
+
+    def _write_shard(self, out, index: int, total: int, strided: bool):
+        if strided:
+            for word in self.iter_words(index, None, total):
+                out.write(word + b"\n")
+        else:
+            bounds = self._shard_bounds(index, total)
+            words, offsets = self._mapped()
+            out.write(words[offsets[bounds.start]:offsets[bounds.stop]])
+
+    def segment(self, start: int, stop: Optional[int] = None, directory: Optional[str] = None) -> str:
+        """Writes words [start, stop) to a temp file and returns its path."""
+        stop = len(self) if stop is None else stop
+        words, offsets = self._mapped()
+        fd, path = tempfile.mkstemp(prefix=f"{self.name}.{start}-{stop}.", suffix=".txt", dir=directory)
+        with os.fdopen(fd, "wb") as out:
+            if start < stop:
+                out.write(words[offsets[start]:offsets[stop]])
+        return path
+
+    def shard(self, index: int, total: int, strided: bool = False, directory: Optional[str] = None) -> str:
+        """
+        Writes shard `index` of `total` to a temp file and returns its path.
+        Contiguous shards are a single slice of the mapped file; strided shards take every total-th word.
+        """
+        fd, path = tempfile.mkstemp(prefix=f"{self.name}.{index}of{total}.", suffix=".txt", dir=directory)
+        with os.fdopen(fd, "wb") as out:
+            self._write_shard(out, index, total, strided)
+        return path
+
+    def fifo(self, index: int, total: int, strided: bool = False, directory: Optional[str] = None) -> str:
+        """
+        Creates a named pipe that streams shard `index` of `total` to whichever process opens it.
+        The writer thread blocks until the reader opens the pipe and removes it when done.
+        """
+        fifo_dir = tempfile.mkdtemp(prefix="wordlist-fifo-", dir=directory)
+        path = os.path.join(fifo_dir, f"{self.name}.{index}of{total}.txt")
+        os.mkfifo(path)
+
+        def feed():
+            try:
+                with open(path, "wb") as out:
+                    self._write_shard(out, index, total, strided)
+            except BrokenPipeError:
+                logger.warning(f"Reader closed wordlist pipe {path} early")
+            finally:
+                os.remove(path)
+                os.rmdir(fifo_dir)
+
+        threading.Thread(target=feed, name=f"wordlist-fifo-{index}", daemon=True).start()
+        return path
+
+    def subset(self, extensions: Optional[List[str]] = None, prefix: Optional[str] = None) -> str:
+        """
+        Returns a cached file with the words that end in one of `extensions` and/or start with `prefix`.
+        """
+        suffixes = tuple(("." + e.lstrip(".")).encode() for e in extensions or [])
+        prefix_bytes = prefix.encode() if prefix else b""
+        key = hashlib.sha256(repr((sorted(suffixes), prefix_bytes)).encode()).hexdigest()[:12]
+        path = os.path.join(get_cache_dir(), f"{self.name}.{self.version[:16]}.subset-{key}.txt")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as out:
+                for word in self.iter_words():
+                    if (not suffixes or word.endswith(suffixes)) and word.startswith(prefix_bytes):
+                        out.write(word + b"\n")
+            os.replace(tmp_path, path)
+        return path
+
+
+class WordlistStore:
+    """
+    Preprocesses bundled wordlists once into a cleaned words file and an offsets index.
+    Results are cached on disk (RECON_WORDLIST_CACHE), keyed by the source content digest,
+    and handles are shared within the process.
+    """
+
+    def __init__(self, source_dir: str = WORDLISTS_DIR):
+        self.source_dir = source_dir
+        self._handles: Dict[str, WordlistHandle] = {}
+        self._lock = threading.Lock()
+
+    def find_by_path(self, path: str) -> Optional[WordlistHandle]:
+        """Returns the loaded handle whose cleaned words file is `path`, if any."""
+        path = os.path.abspath(path)
+        with self._lock:
+            return next((h for h in self._handles.values() if os.path.abspath(h.path) == path), None)
+
+    def get(self, name: str) -> WordlistHandle:
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is None:
+                handle = self._load(name)
+                self._handles[name] = handle
+            return handle
+
+    def _load(self, name: str) -> WordlistHandle:
+        source = os.path.join(self.source_dir, name)
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Wordlist not found: {source}")
+        stat = os.stat(source)
+        cache_dir = get_cache_dir()
+        # Lists with the same file name in different directories must not share cache metadata.
+        source_key = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:12]
+        meta_path = os.path.join(cache_dir, f"{os.path.basename(name)}.{source_key}.meta.json")
+
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["size"] == stat.st_size and meta["mtime"] == stat.st_mtime and \
+                    os.path.exists(meta["words"]) and os.path.exists(meta["index"]):
+                return WordlistHandle(name, meta["words"], meta["index"], meta["version"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        version = _source_digest(source)
+        words_path = os.path.join(cache_dir, f"{os.path.basename(name)}.{version[:16]}.words")
+        index_path = os.path.join(cache_dir, f"{os.path.basename(name)}.{version[:16]}.idx")
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        offsets = array("Q", [0])
+        with open(source, "rb") as src, open(words_path + tmp_suffix, "wb") as words:
+            for word in clean_words(src):
+                words.write(word + b"\n")
+                offsets.append(offsets[-1] + len(word) + 1)
+        with open(index_path + tmp_suffix, "wb") as index:
+            offsets.tofile(index)
+        os.replace(words_path + tmp_suffix, words_path)
+        os.replace(index_path + tmp_suffix, index_path)
+        with open(meta_path + tmp_suffix, "w") as f:
+            json.dump({"size": stat.st_size, "mtime": stat.st_mtime, "version": version,
+                       "words": words_path, "index": index_path, "count": len(offsets) - 1}, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+        logger.info(f"Indexed wordlist {name}: {len(offsets) - 1} unique words")
+        return WordlistHandle(name, words_path, index_path, version)
+
+
+_default_store = WordlistStore()
+
+
+def get_wordlist(name: str) -> WordlistHandle:
+    """Returns the handle of a bundled wordlist from the shared store."""
+    return _default_store.get(name)
+
+
+def open_wordlist(path: str) -> WordlistHandle:
+    """
+    Returns a handle for an arbitrary wordlist path: the store handle if the path is one of its
+    words files, otherwise the file is indexed through a store rooted at its directory.
+    """
+    handle = _default_store.find_by_path(path)
+    if handle is not None:
+        return handle
+    return WordlistStore(os.path.dirname(os.path.abspath(path))).get(os.path.basename(path))
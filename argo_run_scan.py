@@ -1,16 +1,17 @@
 import os
 import json
+import atexit
 import logging
 import sys
-import time
-import random
-import requests
 import datetime 
 from functools import partial 
+from typing import Optional
 
 from tasks import execute_scan_logic
+from app.status_reporter import StatusReporter
+from app.events import (EVENT_RECON_COMPLETE, ScanEventPublisher, get_progressive_events_topic,
+                        progressive_events_enabled, set_event_publisher)
 
-from google.cloud import pubsub_v1
 from google.cloud import storage
 
 logging.basicConfig(level=logging.INFO)
@@ -18,32 +19,30 @@ logger = logging.getLogger("ArgoWorker")
 
 FASTAPI_INTERNAL_URL = "http://fastapi-gateway-svc.default.svc.cluster.local:80/api/v1/internal"
 
+_status_reporter = None
+
+def get_status_reporter() -> StatusReporter:
+    """The background reporter that delivers status updates off the scan's critical path."""
+    global _status_reporter
+    if _status_reporter is None:
+        _status_reporter = StatusReporter(FASTAPI_INTERNAL_URL)
+        # Also covers the sys.exit() paths that bypass the explicit flushes in main().
+        atexit.register(_status_reporter.close)
+    return _status_reporter
+
 def update_scan_status(scan_id: str, status: str):
-    """Calls the internal FastAPI endpoint to update the overall Scan status."""
-    try:
-        payload = {"scan_id": scan_id, "status": status}
-        response = requests.post(f"{FASTAPI_INTERNAL_URL}/scan/status", json=payload, timeout=5)
-        response.raise_for_status() # Raise an exception for bad status codes
-        logger.info(f"Successfully updated Scan {scan_id} status to {status}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to update Scan status to {status} for {scan_id}: {e}")
-        # Non-fatal, log the error but allow the workflow to continue
+    """Queues an update of the overall Scan status for the internal FastAPI endpoint."""
+    get_status_reporter().report_scan(scan_id, status)
 
 def update_tool_status(scan_id: str, tool_name: str, status: str):
-    """Calls the internal FastAPI endpoint to update a specific ToolExecution status."""
-    try:
-        payload = {
-            "scan_id": scan_id,
-            "tool_name": tool_name,
-            "status": status,
-            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-        }
-        response = requests.post(f"{FASTAPI_INTERNAL_URL}/tool/status", json=payload, timeout=5)
-        response.raise_for_status()
-        logger.info(f"Successfully updated Tool {tool_name} for Scan {scan_id} to {status}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to update Tool {tool_name} status to {status} for {scan_id}: {e}")
-        # Non-fatal, log the error but allow the tool to run
+    """Queues an update of a specific ToolExecution status for the internal FastAPI endpoint."""
+    timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    get_status_reporter().report_tool(scan_id, tool_name, status, timestamp)
+
+def flush_status_updates():
+    """Delivers every queued status update before the worker exits."""
+    if _status_reporter is not None:
+        _status_reporter.close()
 
 def upload_to_gcs(bucket_name: str, scan_id: str, payload_json: str):
     """
@@ -67,39 +66,30 @@ def upload_to_gcs(bucket_name: str, scan_id: str, payload_json: str):
         # If this fails, the vuln scan cannot run.
         sys.exit(1)
 
-def publish_to_pubsub(project_id: str, topic_id: str, scan_id: str, target: str, max_retries: int = 5):
+def publish_to_pubsub(publisher: ScanEventPublisher, scan_id: str, target: str):
     """
-    Publishes a message to a Pub/Sub topic with production-grade retries.
+    Publishes the final recon_complete message behind the progressive events of the scan,
+    then waits once for everything the scan published. The client retries failed publishes itself.
     """
-    publisher = pubsub_v1.PublisherClient()
-    topic_path = publisher.topic_path(project_id, topic_id)
-    
-    message_data = {
-        "scan_id": scan_id,
-        "target": target,
-        "status": "recon_complete"
-    }
-    data = json.dumps(message_data).encode("utf-8")
-
-    base_delay_seconds = 1
-    jitter_max = 0.5
-
-    for attempt in range(max_retries):
-        try:
-            future = publisher.publish(topic_path, data)
-            message_id = future.result(timeout=30)
-            logger.info(f"Successfully published message {message_id} to {topic_path} on attempt {attempt + 1}")
-            return
-            
-        except Exception as e:
-            logger.warning(f"Failed to publish Pub/Sub message (Attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                logger.error(f"CRITICAL: Failed to publish Pub/Sub message after {max_retries} attempts. Giving up.")
-                return 
-
-            delay = (base_delay_seconds * 2**attempt) + (random.random() * jitter_max)
-            logger.info(f"Retrying in {delay:.2f} seconds...")
-            time.sleep(delay)
+    publisher.publish(scan_id, EVENT_RECON_COMPLETE, {"target": target})
+    if not publisher.flush():
+        logger.error("CRITICAL: Not every Pub/Sub message of the scan was published.")
+
+
+def create_progress_publisher(project_id: str, topic_id: str) -> Optional[ScanEventPublisher]:
+    """
+    The publisher of progressive events, if they are enabled. A client that cannot be created
+    only disables the events; the scan itself goes on.
+    """
+    if not progressive_events_enabled():
+        return None
+    try:
+        publisher = ScanEventPublisher(project_id, get_progressive_events_topic(topic_id))
+    except Exception as e:
+        logger.error(f"Progressive events disabled, the Pub/Sub client could not be created: {e}")
+        return None
+    set_event_publisher(publisher)
+    return publisher
 
 
 def main():
@@ -134,9 +124,14 @@ def main():
         logger.error(f"Failed to parse RECON_TOOLS_PAYLOAD_JSON: {e}")
         sys.exit(1)
 
+    event_publisher = None
+    progress_publisher = None
     try:
         update_scan_status(scan_id, "recon_running")
 
+        # Per-tool and per-host events go out as artifacts land, so the vuln stage can start early.
+        progress_publisher = create_progress_publisher(gcp_project_id, pubsub_topic_id)
+
         tool_status_callback = partial(update_tool_status, scan_id)
 
         logger.info("Handing off to recon scan logic...")
@@ -151,14 +146,27 @@ def main():
         update_scan_status(scan_id, "recon_complete")
 
         logger.info("Recon complete. Publishing to Pub/Sub...")
-        publish_to_pubsub(gcp_project_id, pubsub_topic_id, scan_id, target)
+        if progress_publisher is not None and get_progressive_events_topic(pubsub_topic_id) == pubsub_topic_id:
+            # Same topic: recon_complete is ordered behind the progressive events of the scan.
+            event_publisher = progress_publisher
+        else:
+            if progress_publisher is not None:
+                progress_publisher.flush()
+            event_publisher = ScanEventPublisher(gcp_project_id, pubsub_topic_id)
+        publish_to_pubsub(event_publisher, scan_id, target)
         
+        flush_status_updates()
         logger.info("--- Argo Worker Complete ---")
         sys.exit(0)
 
     except Exception as e:
         logger.exception(f"Scan logic failed with a critical error: {e}")
         update_scan_status(scan_id, "failed")
+        if event_publisher:
+            event_publisher.flush()
+        if progress_publisher not in (None, event_publisher):
+            progress_publisher.flush()
+        flush_status_updates()
         logger.info("--- Argo Worker Failed ---")
         sys.exit(1)
 
@@ -1,4 +1,6 @@
 from celery import Celery
+from celery.signals import celeryd_init
+from kombu import Queue
 import os
 
 celery = Celery(
@@ -7,10 +9,48 @@ celery = Celery(
     backend=os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis-recon:6379/0')
 )
 
+# Queues of per-tool tasks (see ToolRunner.register_tool), each served by its own workers:
+# raw-socket scanners are few and packet heavy, HTTP brute-forcers moderate, passive OSINT mostly waits on APIs.
+TOOL_QUEUES = {
+    'raw_socket': {'concurrency': 1, 'prefetch': 1},
+    'http': {'concurrency': 4, 'prefetch': 1},
+    'osint': {'concurrency': 8, 'prefetch': 1},
+}
+
 celery.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    task_default_queue='celery',
+    task_queues=[Queue('celery')] + [Queue(name) for name in TOOL_QUEUES],
+    task_routes={'tasks.finalize_scan': {'queue': 'celery'}},
+    # Tool tasks run for minutes to hours: take one at a time and acknowledge only once done.
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
 )
+
+
+def get_queue_settings(queue: str) -> dict:
+    """Concurrency and prefetch of a tool queue, overridable with RECON_<QUEUE>_CONCURRENCY / _PREFETCH."""
+    settings = dict(TOOL_QUEUES[queue])
+    for key in settings:
+        value = os.environ.get(f'RECON_{queue.upper()}_{key.upper()}')
+        if value:
+            settings[key] = max(1, int(value))
+    return settings
+
+
+@celeryd_init.connect
+def configure_tool_worker(sender=None, conf=None, options=None, **kwargs):
+    """A worker started for a single tool queue (-Q raw_socket) takes that queue's concurrency and prefetch."""
+    queues = (options or {}).get('queues') or []
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    if len(queues) != 1 or queues[0] not in TOOL_QUEUES:
+        return
+    settings = get_queue_settings(queues[0])
+    if not options.get('concurrency'):
+        conf.worker_concurrency = settings['concurrency']
+    conf.worker_prefetch_multiplier = settings['prefetch']
@@ -1,7 +1,9 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 import logging
 from app.models import ScanRequest
 from tasks import run_recon_scan
+from app.findings import get_findings_store
+from app.results import final_results_path, file_etag, log_etag, read_log, stream_results
 import os, json
 
 app = Flask(__name__)
@@ -31,12 +33,65 @@ def submit_scan():
 
 @app.route('/results/<string:scan_id>', methods=['GET'])
 def get_results(scan_id):
-    path = os.path.join("/app", "outputs", scan_id, "final_results.json")
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return jsonify(json.load(f)), 200
+    """
+    Returns the results of a scan without parsing them.
+    - Finished scans stream final_results.json with an ETag and Last-Modified, so unchanged polls get a 304.
+    - tool, offset and limit return a slice of the per-tool results from the scan's result log.
+    - While the scan runs, the results of the tools that already finished are returned with a 202.
+    """
+    path = final_results_path(scan_id)
+    tool_name = request.args.get("tool")
+    offset = request.args.get("offset", default=0, type=int)
+    limit = request.args.get("limit", type=int)
+    finished = os.path.exists(path)
+
+    if finished and not (tool_name or offset or limit is not None):
+        response = send_file(path, mimetype="application/json", conditional=True, etag=file_etag(path), max_age=0)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    status = "complete" if finished else "pending"
+    etag = log_etag(scan_id, status, tool_name, offset, limit)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-        return jsonify({"status": "pending", "message": "Scan still in progress"}), 202
+        entries = read_log(scan_id, tool_name)
+        page = entries[offset:offset + limit if limit is not None else None]
+        header = {"scan_id": scan_id, "status": status, "offset": offset, "total": len(entries)}
+        response = Response(stream_with_context(stream_results(scan_id, header, page)),
+                            status=200 if finished else 202, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/findings/<string:scan_id>', methods=['GET'])
+def get_findings(scan_id):
+    """
+    Queries the findings index of a scan.
+    Filters: host, port, tool, kind; paging with limit (default 1000) and offset.
+    format=jsonl streams every matching finding as JSON lines instead.
+    """
+    try:
+        filters = {
+            "scan_id": scan_id,
+            "host": request.args.get("host"),
+            "port": request.args.get("port", type=int),
+            "tool": request.args.get("tool"),
+            "kind": request.args.get("kind"),
+        }
+        store = get_findings_store()
+        if request.args.get("format") == "jsonl":
+            lines = (json.dumps(record) + "\n" for record in store.iter_findings(**filters))
+            return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+        limit = request.args.get("limit", default=1000, type=int)
+        offset = request.args.get("offset", default=0, type=int)
+        findings = store.query(**filters, limit=limit, offset=offset)
+        return jsonify({"scan_id": scan_id, "findings": findings, "count": len(findings), "offset": offset}), 200
+
+    except Exception as e:
+        logger.exception("Error querying findings")
+        return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=True)
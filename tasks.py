@@ -1,11 +1,28 @@
 import logging
 import os
 import json
+import time
+import threading
+from celery import chain, group
 from celery_app import celery
-from app.models import ScanRequest, ScanResponse, ToolOutput
-from app.tool_runner import ToolRunner
-from app.utils import reverse_dns_lookup, resolve_to_ip
-from typing import Callable
+from app.models import ScanRequest, ScanResponse, ToolOutput, ToolExecutionRequest, TargetToolResult
+from app.tool_runner import ToolRunner, ToolSkipped
+from app.scheduler import ToolScheduler
+from app.pipeline import PostProcessingPipeline
+from app.subdomains import run_subdomain_aggregation
+from app.sharding import SHARDABLE_TOOLS, pop_shard_count
+from app.wordlist_ranking import pop_time_budget
+from app.targets import (Invocation, get_batch_size, is_network, load_target_findings, masscan_addresses,
+                         parse_targets, plan_invocations)
+from app.results import ResultLog, compact, iter_result_bytes, read_log
+from app.result_cache import pop_cache_bypass, remember_result, result_fingerprint, reuse_result
+from app.gcs_utils import delete_local_directory
+from app.events import publish_tool_event
+from app.deadline import (ScanDeadline, adaptive_timeout, command_shape, get_default_timeout, get_scan_deadline,
+                          record_duration)
+from app.utils import reverse_dns_lookup, is_ip_address, get_dns_cache_stats
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,100 +34,388 @@ def run_recon_scan(scan_request_data: dict):
     It's kept for potential testing but is NOT used by Argo.
     """
     logger.warning("Executing scan via CELERY (testing only)")
-    execute_scan_logic(scan_request_data, lambda tool_name, status: None)
+    return execute_scan_logic(scan_request_data, lambda tool_name, status: None, fan_out=celery_fan_out_enabled())
 
-def execute_scan_logic(scan_request_data: dict, update_status_callback: Callable[[str, str], None]):
+def run_single_tool(scan_request: ScanRequest, tool_request: ToolExecutionRequest,
+                    update_status_callback: Callable[[str, str], None],
+                    post_processing: Optional[PostProcessingPipeline] = None,
+                    targets: Optional[List[str]] = None, scope_id: Optional[str] = None,
+                    timeout: Optional[float] = None) -> ToolOutput:
+    """
+    Builds and executes a single tool of a scan, reporting its status transitions.
+    In multi-target scans, targets and scope_id describe one invocation planned by plan_invocations.
+    timeout defaults to RECON_TOOL_TIMEOUT; 0 means the scan deadline has passed.
+    Never raises: failures are returned as an unsuccessful ToolOutput.
+    """
+    tool_name = tool_request.name
+    scan_id = scope_id or scan_request.scan_id
+    targets = targets or [scan_request.target]
+    try:
+        # --- NEW: Report 'running' status ---
+        update_status_callback(tool_name, "running")
+
+        if timeout is None:
+            timeout = get_default_timeout()
+        if timeout <= 0:
+            raise RuntimeError("Scan deadline reached before the tool started.")
+        if post_processing is not None:
+            # An earlier run of the tool in this scope may still be uploading, then deleting, its output directory.
+            post_processing.wait_for((scan_id, tool_name.lower()))
+
+        current_target = targets[0]
+        builder_kwargs = {}
+        if len(targets) > 1:
+            builder_kwargs["targets"] = targets
+        elif tool_name.lower() == 'masscan':
+            # masscan only takes addresses; scan every address the target resolves to.
+            current_target = ",".join(masscan_addresses(targets)) or current_target
+            logger.info(f"Resolved {targets[0]} to {current_target} for masscan")
+
+        shards, parameters = pop_shard_count(tool_name, tool_request.parameters)
+        time_budget, parameters = pop_time_budget(parameters)
+        bypass_cache, parameters = pop_cache_bypass(parameters)
+        builder = ToolRunner.get_command_builder(tool_name.lower())
+        command = builder(
+            target=current_target,
+            parameters=parameters,
+            scan_id=scan_id,
+            tool_name=tool_name,
+            **builder_kwargs
+        )
+
+        fingerprint = result_fingerprint(tool_name, targets, command, scan_id)
+        cached = reuse_result(fingerprint, scan_id, tool_name) if scan_request.use_cache and not bypass_cache else None
+        if cached is not None:
+            # Only the builder's helper files are here; the artifacts were copied in the bucket.
+            delete_local_directory(os.path.join("/app", "outputs", scan_id, tool_name))
+            cached.targets = targets
+            cached.fingerprint = fingerprint
+            publish_tool_event(scan_id, cached)
+            update_status_callback(tool_name, "completed")
+            return cached
+
+        if time_budget and shards > 1:
+            logger.warning(f"Time budget is not applied to sharded {tool_name} runs.")
+        logger.info(f"Running {tool_name} with a timeout of {timeout:.0f} seconds")
+        if shards > 1:
+            tool_result = ToolRunner.execute_sharded(
+                command,
+                scan_id=scan_id,
+                tool_name=tool_name,
+                shards=shards,
+                timeout=timeout,
+                post_processing=post_processing
+            )
+        elif time_budget and tool_name.lower() in SHARDABLE_TOOLS:
+            tool_result = ToolRunner.execute_budgeted(
+                command,
+                scan_id=scan_id,
+                tool_name=tool_name,
+                time_budget=time_budget,
+                timeout=timeout,
+                post_processing=post_processing
+            )
+        else:
+            started = time.monotonic()
+            tool_result = ToolRunner.execute_command(
+                command,
+                scan_id=scan_id,
+                tool_name=tool_name,
+                timeout=timeout,
+                post_processing=post_processing
+            )
+            # Only complete single-process runs are representative of how long the tool needs.
+            if tool_result.success and not tool_result.partial:
+                record_duration(command_shape(tool_name, tool_request.parameters), time.monotonic() - started,
+                                len(targets))
+
+        tool_result.targets = targets
+        tool_result.fingerprint = fingerprint
+        # --- NEW: Report 'completed' status ---
+        update_status_callback(tool_name, "completed")
+        return tool_result
+
+    except ToolSkipped as e:
+        logger.info(f"Tool {tool_name} skipped: {e}")
+        update_status_callback(tool_name, "completed")
+        return ToolOutput(
+            tool_name=tool_name,
+            command=[],
+            return_code=0,
+            stdout=f"Skipped: {e}",
+            stderr="",
+            output_file_paths=[],
+            success=True,
+            targets=targets
+        )
+
+    except Exception as e:
+        logger.exception(f"Tool {tool_name} failed: {e}")
+
+        # --- NEW: Report 'failed' status ---
+        update_status_callback(tool_name, "failed")
+
+        return ToolOutput(
+            tool_name=tool_name,
+            command=[],
+            return_code=-1,
+            stdout="",
+            stderr=str(e),
+            output_file_paths=[],
+            success=False,
+            targets=targets
+        )
+
+def split_results_by_target(invocations: List[Invocation], results: List[ToolOutput]) -> Dict[str, List[TargetToolResult]]:
+    """
+    Regroups the tool results of a multi-target scan per target.
+    Batched invocations contribute the findings their splitter attributed to each target.
+    """
+    per_target: Dict[str, List[TargetToolResult]] = {}
+    for invocation, result in zip(invocations, results):
+        findings = load_target_findings(invocation.scope_id, result.tool_name) if len(invocation.targets) > 1 else {}
+        for target in invocation.targets:
+            per_target.setdefault(target, []).append(TargetToolResult(
+                tool_name=result.tool_name,
+                success=result.success,
+                findings=findings.get(target, [])
+            ))
+    return per_target
+
+class ScanPlan(NamedTuple):
+    """What every part of a scan needs to know, whether it runs in one process or as separate Celery tasks."""
+    targets: List[str]
+    multi_target: bool
+    target_domain: Optional[str]
+    invocations: List[Invocation]
+
+
+def load_plan(data: list) -> ScanPlan:
+    """Rebuilds a ScanPlan that went through JSON, where tuples become lists."""
+    targets, multi_target, target_domain, invocations = data
+    return ScanPlan(targets, multi_target, target_domain, [Invocation(*inv) for inv in invocations])
+
+
+def plan_scan(scan_request: ScanRequest) -> ScanPlan:
+    """Parses the targets, resolves the domain of a single IP target and plans the tool invocations."""
+    target_domain = None
+    targets = parse_targets(scan_request.target, scan_request.targets)
+    multi_target = len(targets) > 1 or any(is_network(t) for t in targets)
+
+    if not multi_target and is_ip_address(targets[0]):
+        target_domain = reverse_dns_lookup(targets[0])
+        if target_domain:
+            logger.info(f"Resolved IP {targets[0]} to domain {target_domain}")
+
+    tool_names = [tool.name for tool in scan_request.tools]
+    if multi_target:
+        invocations = plan_invocations(
+            scan_request.scan_id, tool_names, targets,
+            [name.lower() for name in ToolRunner.get_batch_tools()], get_batch_size(scan_request.batch_size)
+        )
+    else:
+        invocations = [Invocation(index, scan_request.scan_id, targets) for index in range(len(tool_names))]
+    return ScanPlan(targets, multi_target, target_domain, invocations)
+
+
+def invocation_tool_names(scan_request: ScanRequest, plan: ScanPlan) -> List[str]:
+    return [scan_request.tools[inv.tool_index].name for inv in plan.invocations]
+
+
+def celery_fan_out_enabled() -> bool:
+    """
+    Opt-in (RECON_CELERY_FANOUT=true): run_recon_scan then dispatches per-tool tasks and returns
+    {"status": "dispatched"} instead of the scan summary, and needs workers on the tool queues.
+    """
+    return os.getenv("RECON_CELERY_FANOUT", "false").lower() in ("1", "true", "yes")
+
+
+def finish_scan(scan_request: ScanRequest, plan: ScanPlan, results: List[ToolOutput]):
+    """
+    Runs the scan-wide steps once every tool has finished: result caching, subdomain aggregation,
+    the overall status, and final_results.json compacted from the result log.
+    """
+    for index, result in enumerate(results):
+        remember_result(plan.invocations[index].scope_id, result)
+
+    for scope_id in dict.fromkeys(inv.scope_id for inv in plan.invocations):
+        scope_targets = [inv.targets for inv in plan.invocations if inv.scope_id == scope_id][0]
+        if len(scope_targets) == 1 and is_ip_address(scope_targets[0]):
+            subdomain_domain = plan.target_domain if not plan.multi_target else None
+        else:
+            subdomain_domain = scope_targets[0] if len(scope_targets) == 1 else None
+        if not run_subdomain_aggregation(scope_id, subdomain_domain):
+            logger.error(f"Failed to upload aggregated subdomains for scan {scope_id}")
+
+    upload_failures = [r.tool_name for r in results if r.artifacts_uploaded is False]
+    partial_results = [r.tool_name for r in results if r.partial]
+    succeeded = [r.success and not r.partial and r.artifacts_uploaded is not False for r in results]
+    if all(succeeded):
+        status = "success"
+        message = "All tools executed successfully."
+    elif any(succeeded):
+        status = "partial_failure"
+        message = "Some tools failed."
+    else:
+        status = "failed"
+        message = "All tools failed."
+    if partial_results:
+        message += f" Partial results for: {', '.join(partial_results)}."
+    if upload_failures:
+        message += f" Artifact upload failed for: {', '.join(upload_failures)}."
+
+    summary = ScanResponse(
+        scan_id=scan_request.scan_id,
+        target=scan_request.target,
+        target_domain=plan.target_domain,
+        targets=plan.targets,
+        results=[],
+        target_results=split_results_by_target(plan.invocations, results) if plan.multi_target else {},
+        message=message,
+        status=status
+    )
+    # The results array is copied from the result log instead of being serialized again.
+    compact(scan_request.scan_id, summary.model_dump(mode="json", exclude={"results"}))
+
+    logger.info(f"Recon scan {scan_request.scan_id} completed. DNS cache: {get_dns_cache_stats()}")
+    return {"status": "complete", "scan_id": scan_request.scan_id}
+
+
+@celery.task(name='tasks.run_scan_tool')
+def run_scan_tool(scan_request_data: dict, index: int, invocation: list, deadline_at: Optional[float] = None):
+    """
+    Runs one tool invocation of a fanned-out scan on the queue of its tool.
+    Uploads finish before the task returns, and the result is appended to the scan's result log
+    where finalize_scan picks it up. deadline_at (epoch seconds) caps the tool's timeout.
+    """
+    scan_request = ScanRequest(**scan_request_data)
+    invocation = Invocation(*invocation)
+    tool_request = scan_request.tools[invocation.tool_index]
+    timeout = get_default_timeout()
+    if deadline_at is not None:
+        shape = command_shape(tool_request.name, tool_request.parameters)
+        timeout = max(0, min(adaptive_timeout(shape, len(invocation.targets)), deadline_at - time.time()))
+    result = run_single_tool(scan_request, tool_request, lambda tool_name, status: None,
+                             targets=invocation.targets, scope_id=invocation.scope_id, timeout=timeout)
+    ResultLog(scan_request.scan_id).append(index, result.tool_name, result.model_dump_json())
+    return index
+
+
+@celery.task(name='tasks.finalize_scan')
+def finalize_scan(scan_request_data: dict, plan_data: list):
+    """Chord callback of a fanned-out scan: rebuilds the results from the result log and finishes the scan."""
+    scan_request = ScanRequest(**scan_request_data)
+    plan = load_plan(plan_data)
+    entries = read_log(scan_request.scan_id)
+    logged = {entry.index: ToolOutput.model_validate_json(body)
+              for entry, body in zip(entries, iter_result_bytes(scan_request.scan_id, entries))}
+    results = []
+    for index, tool_name in enumerate(invocation_tool_names(scan_request, plan)):
+        if index not in logged:
+            # The task died without recording a result (e.g. the worker was killed).
+            logged[index] = ToolOutput(tool_name=tool_name, command=[], return_code=-1, stdout="",
+                                       stderr="Tool task did not record a result.", success=False,
+                                       targets=plan.invocations[index].targets)
+            ResultLog(scan_request.scan_id).append(index, tool_name, logged[index].model_dump_json())
+        results.append(logged[index])
+    return finish_scan(scan_request, plan, results)
+
+
+def dispatch_scan(scan_request: ScanRequest, plan: ScanPlan):
+    """
+    Fans a scan out as one Celery task per tool invocation, each on its tool's queue.
+    Invocations run in dependency stages (a group per stage, chained), and finalize_scan runs
+    as the chord callback once the last stage is done. Stages are computed per scope, so the
+    invocations of a multi-target scan's targets run side by side.
+    """
+    scan_request_data = scan_request.model_dump()
+    tool_names = invocation_tool_names(scan_request, plan)
+    stages = ToolScheduler(ToolRunner.get_dependencies).stages(tool_names, [inv.scope_id for inv in plan.invocations])
+    budget = get_scan_deadline(scan_request.deadline)
+    deadline_at = time.time() + budget if budget else None
+    workflow = chain(
+        *[group(run_scan_tool.si(scan_request_data, index, plan.invocations[index], deadline_at).set(
+            queue=ToolRunner.get_queue(tool_names[index])) for index in stage) for stage in stages],
+        finalize_scan.si(scan_request_data, plan)
+    )
+    workflow.apply_async()
+    logger.info(f"Dispatched {len(tool_names)} tool tasks in {len(stages)} stages for scan {scan_request.scan_id}")
+    return {"status": "dispatched", "scan_id": scan_request.scan_id}
+
+
+def aggregate_tool_status(update_status_callback: Callable[[str, str], None],
+                          tool_names: List[str]) -> Callable[[str, str], None]:
+    """
+    Wraps a status callback so a tool with several invocations (one per target or batch) reports
+    one status: 'running' when its first invocation starts, then 'failed' if any invocation failed,
+    else 'completed', once its last invocation has finished.
+    """
+    pending = Counter(tool_names)
+    started, failed = set(), set()
+    lock = threading.Lock()
+
+    def report(tool_name: str, status: str):
+        with lock:
+            if status == "running":
+                if tool_name in started:
+                    return
+                started.add(tool_name)
+            else:
+                pending[tool_name] -= 1
+                if status == "failed":
+                    failed.add(tool_name)
+                if pending[tool_name] > 0:
+                    return
+                status = "failed" if tool_name in failed else status
+        update_status_callback(tool_name, status)
+
+    return report
+
+
+def execute_scan_logic(scan_request_data: dict, update_status_callback: Callable[[str, str], None],
+                       fan_out: bool = False):
     """
     Core scan logic, callable from anywhere.
+    With fan_out, tools are dispatched as Celery tasks and the call returns once they are queued.
     """
     try:
         scan_request = ScanRequest(**scan_request_data)
         logger.info(f"Recon worker starting scan for target: {scan_request.target}, ID: {scan_request.scan_id}")
 
-        results = []
-        target_domain = None
-
-        if scan_request.target.replace('.', '').isdigit():
-            target_domain = reverse_dns_lookup(scan_request.target)
-            if target_domain:
-                logger.info(f"Resolved IP {scan_request.target} to domain {target_domain}")
-
-        for tool_request in scan_request.tools:
-            tool_name = tool_request.name
-            try:
-                # --- NEW: Report 'running' status ---
-                update_status_callback(tool_name, "running")
-
-                current_target = scan_request.target
-                if tool_name.lower() == 'masscan':
-                    current_target = resolve_to_ip(scan_request.target)
-                    logger.info(f"Resolved {scan_request.target} to {current_target} for masscan")
-
-                builder = ToolRunner.get_command_builder(tool_name.lower())
-                command = builder(
-                    target=current_target,
-                    parameters=tool_request.parameters,
-                    scan_id=scan_request.scan_id,
-                    tool_name=tool_name
-                )
-
-                tool_result = ToolRunner.execute_command(
-                    command,
-                    scan_id=scan_request.scan_id,
-                    tool_name=tool_name
-                )
-                results.append(tool_result)
-                
-                # --- NEW: Report 'completed' status ---
-                update_status_callback(tool_name, "completed")
-
-            except Exception as e:
-                logger.exception(f"Tool {tool_name} failed: {e}")
-                
-                # --- NEW: Report 'failed' status ---
-                update_status_callback(tool_name, "failed")
-
-                results.append(ToolOutput(
-                    tool_name=tool_name,
-                    command=[],
-                    return_code=-1,
-                    stdout="",
-                    stderr=str(e),
-                    output_file_paths=[],
-                    success=False
-                ))
-
-        all_success = all(r.success for r in results)
-        any_success = any(r.success for r in results)
-        if all_success:
-            status = "success"
-            message = "All tools executed successfully."
-        elif any_success:
-            status = "partial_failure"
-            message = "Some tools failed."
-        else:
-            status = "failed"
-            message = "All tools failed."
-
-        response = ScanResponse(
-            scan_id=scan_request.scan_id,
-            target=scan_request.target,
-            target_domain=target_domain,
-            results=results,
-            message=message,
-            status=status
-        )
+        plan = plan_scan(scan_request)
+        if fan_out:
+            return dispatch_scan(scan_request, plan)
 
-        output_dir = os.path.join("/app", "outputs", scan_request.scan_id)
-        os.makedirs(output_dir, exist_ok=True)
-        with open(os.path.join(output_dir, "final_results.json"), "w", encoding="utf-8") as f:
-            f.write(response.model_dump_json(indent=4))
+        result_log = ResultLog(scan_request.scan_id)
+        tool_names = invocation_tool_names(scan_request, plan)
+        scheduler = ToolScheduler(ToolRunner.get_dependencies)
+        update_tool_status = aggregate_tool_status(update_status_callback, tool_names)
+        shapes = [command_shape(name, scan_request.tools[inv.tool_index].parameters)
+                  for name, inv in zip(tool_names, plan.invocations)]
+        deadline = ScanDeadline(get_scan_deadline(scan_request.deadline), shapes,
+                                [len(inv.targets) for inv in plan.invocations], scheduler.max_workers)
 
-        logger.info(f"Recon scan {scan_request.scan_id} completed.")
-        return {"status": "complete", "scan_id": scan_request.scan_id}
+        # Uploads and cleanup overlap with the next tools; leaving the block waits for them.
+        with PostProcessingPipeline() as post_processing:
+            def run_tool(index: int) -> ToolOutput:
+                invocation = plan.invocations[index]
+                result = run_single_tool(scan_request, scan_request.tools[invocation.tool_index], update_tool_status,
+                                         post_processing, targets=invocation.targets, scope_id=invocation.scope_id,
+                                         timeout=deadline.timeout_for(index))
+                # Persisted right away: readable through /results while the scan runs, and kept if it crashes.
+                result_log.append(index, result.tool_name, result.model_dump_json())
+                return result
+
+            results = scheduler.run(tool_names, run_tool, [inv.scope_id for inv in plan.invocations])
+
+        # Upload outcomes arrive after the first record of a tool; the newer record supersedes it.
+        for index, result in enumerate(results):
+            if result.artifacts_uploaded is not None:
+                result_log.append(index, result.tool_name, result.model_dump_json())
+
+        return finish_scan(scan_request, plan, results)
 
     except Exception as e:
         logger.exception("Critical error in Recon worker logic")
         # Re-raise the exception so the main argo_run_scan.py can catch it
         raise
-